@@ -3,9 +3,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
-import os
+from app.replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 csrf = CSRFProtect()
 migrate = Migrate()
@@ -14,21 +14,42 @@ Title = 'CoolStack'
 
 def create_app():
     app = Flask(__name__, instance_relative_config=True)
-    app.config['SECRET_KEY'] = 'your_secret_key'
-    db_url = os.environ.get("DATABASE_URL")
-    if db_url and db_url.startswith("postgres://"):
-        db_url = db_url.replace("postgres://", "postgresql://", 1)
-
-    app.config["SQLALCHEMY_DATABASE_URI"] = db_url or "sqlite:///../instance/coolstack.db"
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['WTF_CSRF_TIME_LIMIT'] = None
-    app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'static', 'uploads')
+    from app.config import Config, check_pool
+    app.config.from_object(Config(app))
+    check_pool(app)
 
     db.init_app(app)
     migrate.init_app(app, db) 
     login_manager.init_app(app)
     csrf.init_app(app)
 
+    from app.cache import cache
+    cache.init_app(app)
+
+    from app import storage
+    storage.init_app(app)
+
+    from app import media
+    media.init_app(app)
+
+    from app import assets
+    assets.init_app(app)
+
+    from app import conditional
+    conditional.init_app(app)
+
+    from app import profiling
+    profiling.init_app(app)
+
+    from app import replicas
+    replicas.init_app(app)
+
+    from app import realtime
+    realtime.init_app(app)
+
+    from app import categories
+    categories.init_app(app)
+
     login_manager.login_view = 'main.login'
     login_manager.login_message_category = 'info'
 
@@ -36,9 +57,18 @@ def create_app():
     from app import routes
     app.register_blueprint(routes.bp, url_prefix='/main') 
 
+    from app import api
+    app.register_blueprint(api.bp, url_prefix='/api/v1')
+
     from app.models import User, Post, Like
 
+    from app import commands
+    commands.init_app(app)
+
     with app.app_context():
         db.create_all()
 
+    from app import search
+    search.init_app(app)
+
     return app
@@ -0,0 +1,104 @@
+"""Writes shared by the HTML views and the JSON API.
+
+Each one commits, then broadcasts the new counts over the live-update
+stream; callers only check permissions and shape the response.
+"""
+from sqlalchemy import func, select
+
+from app import db, likebuffer, realtime, suggestions, timeline
+from app.media import upload_url
+from app.models import Comment, Like, Post, User
+
+
+def like(user, post, liked=None):
+    """Like (True), unlike (False) or toggle (None) `post`.
+
+    Returns (liked, like_count). With LIKE_WRITE_BEHIND on, the toggle is
+    buffered and the count is the stored one plus what is still buffered.
+    """
+    buffer = likebuffer.get_buffer()
+    if buffer is not None:
+        liked = buffer.set(user.id, post.id, liked)
+        like_count = post.like_count + buffer.pending_deltas([post.id]).get(post.id, 0)
+        realtime.publish(f'post:{post.id}', post=post.id, like_count=like_count)
+        return liked, like_count
+
+    if liked is None:
+        liked, delta = Like.toggle(user.id, post.id)
+    else:
+        delta = Like.set(user.id, post.id, liked)
+    if delta:
+        post.like_count = Post.like_count + delta
+        suggestions.mark_changed(user.id)
+    db.session.commit()
+
+    if delta:
+        realtime.publish(f'post:{post.id}', post=post.id, like_count=post.like_count)
+    return liked, post.like_count
+
+
+def follow(user, other, following=None):
+    """Follow (True), unfollow (False) or toggle (None) `other`; returns the new state."""
+    if following is None:
+        following, delta = user.toggle_follow(other)
+    else:
+        delta = user.set_following(other, following)
+    if delta:
+        user.following_count = User.following_count + delta
+        other.follower_count = User.follower_count + delta
+    if not following:
+        timeline.retract_author(user.id, other.id)
+    if delta:
+        suggestions.mark_changed(user.id)
+        if following:
+            suggestions.drop(user.id, other.id)
+    db.session.commit()
+
+    if delta:
+        realtime.publish(f'user:{other.id}', user=other.id, follower_count=other.follower_count)
+        realtime.publish(f'user:{user.id}', user=user.id, following_count=user.following_count)
+    if following and delta:
+        timeline.queue_backfill(user, other)
+    return following
+
+
+def add_comment(user, post, content, parent_id=None):
+    """Returns the new comment and the delta that was broadcast for it."""
+    comment = Comment(content=content, user_id=user.id, post_id=post.id, parent_id=parent_id)
+    db.session.add(comment)
+    post.comment_count = Post.comment_count + 1
+    db.session.commit()
+
+    author = comment.comment_author
+    delta = {
+        'post': post.id,
+        'comment_count': post.comment_count,
+        'comment': {
+            'id': comment.id,
+            'parent_id': comment.parent_id,
+            'fullname': author.fullname,
+            'username': author.username,
+            'avatar': upload_url('profile_pics', author.profile_pic or 'default.jpg',
+                                 author.profile_pic_variants, '64'),
+            'content': comment.content,
+            'date': comment.date_posted.isoformat() + 'Z',
+        },
+    }
+    realtime.publish(f'post:{post.id}', **delta)
+    return comment, delta
+
+
+def delete_comment(comment):
+    """Delete a comment with its replies and recount the post's comments."""
+    comment_id, post_id, post = comment.id, comment.post_id, comment.post
+
+    # Replies go with their parent (delete-orphan), so recount instead of guessing
+    db.session.delete(comment)
+    db.session.flush()
+    post.comment_count = (
+        select(func.count(Comment.id)).where(Comment.post_id == post_id).scalar_subquery()
+    )
+    db.session.commit()
+
+    realtime.publish(f'post:{post_id}', post=post_id, comment_count=post.comment_count,
+                     removed_comment=comment_id)
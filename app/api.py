@@ -0,0 +1,404 @@
+"""Versioned JSON API (/api/v1) over the same models as the HTML views.
+
+Conventions:
+
+* Lists are newest first and keyset-paginated: {"data": [...], "next_cursor": ...};
+  pass ?cursor= to continue and ?limit= (max 100) to size a page.
+* ?fields=id,title,like_count returns only those fields (sparse fieldsets).
+* Errors are {"error": "..."} with the HTTP status.
+* Large files go through /uploads: POST {kind, filename, size}, PUT the
+  bytes in order with Content-Range, POST /uploads/<id>/finalize, then pass
+  the id in the form's <field>_upload field. GET /uploads/<id> tells a
+  client where to resume after a dropped connection.
+* Auth is the site's session cookie (log in through /main/login with
+  X-Requested-With: XMLHttpRequest); writes need the X-CSRFToken header,
+  whose value GET /me returns.
+"""
+import json
+from functools import wraps
+
+from flask import Blueprint, Response, abort, current_app, request
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from sqlalchemy.orm import joinedload
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import parse_content_range_header
+
+from app import actions, db, likebuffer, uploads
+from app.comments import load_comment_page
+from app.feed import InvalidCursor, feed_page
+from app.media import upload_url, video_url
+from app.models import Comment, Like, Post, User
+from app.replicas import replica_reads
+
+try:
+    import orjson
+except ImportError:  # optional; the stdlib encoder is used without it
+    orjson = None
+
+bp = Blueprint('api', __name__)
+
+MAX_PAGE_SIZE = 100
+MAX_BATCH_IDS = 100
+
+
+# ---------------- SERIALIZATION ----------------
+def _dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+def respond(payload, status=200):
+    return Response(_dumps(payload), status=status, mimetype='application/json')
+
+
+def _iso(value):
+    return value.isoformat() + 'Z' if value else None
+
+
+def user_summary(user):
+    return {
+        'id': user.id,
+        'username': user.username,
+        'fullname': user.fullname,
+        'avatar': upload_url('profile_pics', user.profile_pic or 'default.png',
+                             user.profile_pic_variants, '64'),
+    }
+
+
+# field name -> getter(obj, viewer_state); viewer_state carries the batched
+# "does the viewer like/follow this" lookups so they cost one query per page
+POST_FIELDS = {
+    'id': lambda p, v: p.id,
+    'title': lambda p, v: p.title,
+    'content': lambda p, v: p.content,
+    'category': lambda p, v: p.category,
+    'image': lambda p, v: p.image and upload_url('post_images', p.image, p.image_variants, 'card'),
+    'video': lambda p, v: p.video and video_url(p.video),
+    'date_posted': lambda p, v: _iso(p.date_posted),
+    'like_count': lambda p, v: p.like_count + v['like_delta'].get(p.id, 0),
+    'comment_count': lambda p, v: p.comment_count,
+    'author': lambda p, v: user_summary(p.author),
+    'liked': lambda p, v: p.id in v['liked'],
+}
+
+USER_FIELDS = {
+    'id': lambda u, v: u.id,
+    'username': lambda u, v: u.username,
+    'fullname': lambda u, v: u.fullname,
+    'bio': lambda u, v: u.bio,
+    'avatar': lambda u, v: upload_url('profile_pics', u.profile_pic or 'default.png',
+                                      u.profile_pic_variants, '64'),
+    'cover_photo': lambda u, v: upload_url('cover_photos', u.cover_photo or 'default_cover.jpg',
+                                           u.cover_photo_variants, 'cover'),
+    'follower_count': lambda u, v: u.follower_count,
+    'following_count': lambda u, v: u.following_count,
+    'following': lambda u, v: u.id in v['following'],
+}
+
+COMMENT_FIELDS = {
+    'id': lambda c, v: c.id,
+    'post_id': lambda c, v: c.post_id,
+    'parent_id': lambda c, v: c.parent_id,
+    'content': lambda c, v: c.content,
+    'date_posted': lambda c, v: _iso(c.date_posted),
+    'author': lambda c, v: user_summary(c.comment_author),
+    'replies': lambda c, v: [_shape(r, COMMENT_FIELDS, v['fields'], v)
+                             for r in getattr(c, 'children', [])],
+}
+
+
+def requested_fields(available):
+    """The ?fields= selection, validated against `available` (all by default)."""
+    raw = request.args.get('fields')
+    if not raw:
+        return list(available)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        abort(400, f"unknown field(s) {', '.join(unknown)}; choose from {', '.join(available)}")
+    return fields
+
+
+def viewer_state(fields, posts=(), users=()):
+    """Batch the per-viewer flags the requested fields need."""
+    state = {'fields': fields, 'liked': set(), 'following': set(), 'like_delta': {}}
+    buffer = likebuffer.get_buffer()
+    post_ids = [p.id for p in posts]
+    if buffer is not None and 'like_count' in fields:
+        state['like_delta'] = buffer.pending_deltas(post_ids)
+    if not current_user.is_authenticated:
+        return state
+    if 'liked' in fields and posts:
+        state['liked'] = set(db.session.execute(
+            db.select(Like.post_id).where(Like.user_id == current_user.id, Like.post_id.in_(post_ids))
+        ).scalars())
+        if buffer is not None:
+            # toggles still in the write-behind buffer win over the table
+            for post_id, liked in buffer.pending_states(current_user.id, post_ids).items():
+                (state['liked'].add if liked else state['liked'].discard)(post_id)
+    if 'following' in fields and users:
+        state['following'] = current_user.following_among(u.id for u in users)
+    return state
+
+
+def _shape(obj, table, fields, state):
+    return {name: table[name](obj, state) for name in fields}
+
+
+def serialize_posts(posts):
+    fields = requested_fields(POST_FIELDS)
+    state = viewer_state(fields, posts=posts)
+    return [_shape(p, POST_FIELDS, fields, state) for p in posts]
+
+
+def serialize_users(users):
+    fields = requested_fields(USER_FIELDS)
+    state = viewer_state(fields, users=users)
+    return [_shape(u, USER_FIELDS, fields, state) for u in users]
+
+
+def serialize_comments(comments):
+    fields = requested_fields(COMMENT_FIELDS)
+    state = viewer_state(fields)
+    return [_shape(c, COMMENT_FIELDS, fields, state) for c in comments]
+
+
+# ---------------- HELPERS ----------------
+def login_required(view):
+    # Flask-Login's version redirects to the login page; an API answers 401
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_user.is_authenticated:
+            abort(401, 'log in first')
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _limit():
+    return min(max(request.args.get('limit', 20, type=int), 1), MAX_PAGE_SIZE)
+
+
+def _page(query):
+    try:
+        return feed_page(query, cursor=request.args.get('cursor'), limit=_limit())
+    except InvalidCursor:
+        abort(400, 'invalid cursor')
+
+
+def _id_list():
+    ids = [int(v) for v in request.args.get('ids', '').split(',') if v.strip().isdigit()]
+    if not ids:
+        abort(400, 'pass ?ids=1,2,3')
+    if len(ids) > MAX_BATCH_IDS:
+        abort(400, f'at most {MAX_BATCH_IDS} ids per call')
+    return list(dict.fromkeys(ids))
+
+
+def _json_body():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        abort(400, 'expected a JSON object body')
+    return body
+
+
+@bp.errorhandler(HTTPException)
+def _error(exc):
+    return respond({'error': exc.description}, exc.code)
+
+
+# ---------------- ME ----------------
+@bp.route('/me')
+def me():
+    user = serialize_users([current_user])[0] if current_user.is_authenticated else None
+    return respond({'data': user, 'csrf_token': generate_csrf()})
+
+
+# ---------------- POSTS ----------------
+@bp.route('/posts')
+@replica_reads
+def list_posts():
+    """?category=Art and/or ?author=<username> narrow the list."""
+    query = Post.query
+    if request.args.get('category'):
+        query = query.filter(Post.category == request.args['category'])
+    if request.args.get('author'):
+        author = User.query.filter_by(username=request.args['author']).first_or_404()
+        query = query.filter(Post.user_id == author.id)
+    page = _page(query)
+    return respond({'data': serialize_posts(page.posts), 'next_cursor': page.next_cursor})
+
+
+@bp.route('/posts/batch')
+@replica_reads
+def batch_posts():
+    """?ids=1,2,3 in one call, in the order asked; missing ids are left out.
+
+    With ?fields=id,like_count,comment_count,liked this is the cheap way to
+    refresh counts and like state for a whole screen.
+    """
+    ids = _id_list()
+    found = {p.id: p for p in Post.query.options(joinedload(Post.author)).filter(Post.id.in_(ids))}
+    posts = [found[i] for i in ids if i in found]
+    return respond({'data': serialize_posts(posts)})
+
+
+@bp.route('/posts/<int:post_id>')
+@replica_reads
+def get_post(post_id):
+    post = Post.query.options(joinedload(Post.author)).filter_by(id=post_id).first_or_404()
+    return respond({'data': serialize_posts([post])[0]})
+
+
+@bp.route('/posts/<int:post_id>/like', methods=['PUT', 'DELETE'])
+@login_required
+def like_post(post_id):
+    """PUT likes, DELETE unlikes; both are safe to retry."""
+    post = db.get_or_404(Post, post_id)
+    liked, like_count = actions.like(current_user, post, request.method == 'PUT')
+    return respond({'data': {'post_id': post.id, 'liked': liked, 'like_count': like_count}})
+
+
+# ---------------- COMMENTS ----------------
+@bp.route('/posts/<int:post_id>/comments')
+@replica_reads
+def list_comments(post_id):
+    """Top-level comments, each with its whole reply tree under "replies"."""
+    post = db.get_or_404(Post, post_id)
+    try:
+        page = load_comment_page(post.id, cursor=request.args.get('cursor'), limit=_limit())
+    except InvalidCursor:
+        abort(400, 'invalid cursor')
+    return respond({'data': serialize_comments(page.threads), 'next_cursor': page.next_cursor})
+
+
+@bp.route('/posts/<int:post_id>/comments', methods=['POST'])
+@login_required
+def create_comment(post_id):
+    """Body: {"content": "...", "parent_id": optional comment id on this post}."""
+    post = db.get_or_404(Post, post_id)
+    body = _json_body()
+    content = str(body.get('content') or '').strip()
+    if not content:
+        abort(400, 'content is required')
+    parent_id = body.get('parent_id')
+    if parent_id is not None:
+        parent = db.session.get(Comment, parent_id) if isinstance(parent_id, int) else None
+        if parent is None or parent.post_id != post.id:
+            abort(400, 'parent_id is not a comment on this post')
+
+    comment, _ = actions.add_comment(current_user, post, content, parent_id)
+    comment.children = []
+    return respond({'data': serialize_comments([comment])[0]}, 201)
+
+
+@bp.route('/comments/<int:comment_id>', methods=['DELETE'])
+@login_required
+def delete_comment(comment_id):
+    comment = db.get_or_404(Comment, comment_id)
+    if comment.user_id != current_user.id:
+        abort(403, 'not your comment')
+    actions.delete_comment(comment)
+    return Response(status=204)
+
+
+# ---------------- USERS ----------------
+@bp.route('/users/batch')
+@replica_reads
+def batch_users():
+    """?ids=1,2,3, in the order asked; ?fields=id,follower_count,following works too."""
+    ids = _id_list()
+    found = {u.id: u for u in User.query.filter(User.id.in_(ids))}
+    return respond({'data': serialize_users([found[i] for i in ids if i in found])})
+
+
+@bp.route('/users/<username>')
+@replica_reads
+def get_user(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    return respond({'data': serialize_users([user])[0]})
+
+
+@bp.route('/users/<username>/posts')
+@replica_reads
+def user_posts(username):
+    user = User.query.filter_by(username=username).first_or_404()
+    page = _page(Post.query.filter(Post.user_id == user.id))
+    return respond({'data': serialize_posts(page.posts), 'next_cursor': page.next_cursor})
+
+
+@bp.route('/users/<int:user_id>/follow', methods=['PUT', 'DELETE'])
+@login_required
+def follow_user(user_id):
+    """PUT follows, DELETE unfollows; both are safe to retry."""
+    user = db.get_or_404(User, user_id)
+    if user.id == current_user.id:
+        abort(400, 'you cannot follow yourself')
+    following = actions.follow(current_user, user, request.method == 'PUT')
+    return respond({'data': {'user_id': user.id, 'following': following,
+                             'follower_count': user.follower_count}})
+
+
+# ---------------- UPLOADS ----------------
+def _upload_state(upload):
+    return {'id': upload.id, 'kind': upload.kind, 'size': upload.size,
+            'offset': uploads.received(upload), 'complete': upload.sha256 is not None,
+            'chunk_size': current_app.config['UPLOAD_CHUNK_SIZE']}
+
+
+@bp.route('/uploads', methods=['POST'])
+@login_required
+def start_upload():
+    """Body: {"kind": "post_videos", "filename": "clip.mp4", "size": <bytes>}."""
+    body = _json_body()
+    size = body.get('size')
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        abort(400, 'size must be a positive number of bytes')
+    upload = uploads.start(current_user, str(body.get('kind') or ''),
+                           str(body.get('filename') or ''), size)
+    return respond({'data': _upload_state(upload)}, 201)
+
+
+@bp.route('/uploads/<upload_id>')
+@login_required
+def upload_status(upload_id):
+    return respond({'data': _upload_state(uploads.get_or_404(upload_id, current_user))})
+
+
+@bp.route('/uploads/<upload_id>', methods=['PUT'])
+@login_required
+def upload_chunk(upload_id):
+    """Body: raw bytes for Content-Range: bytes <first>-<last>/<size>.
+
+    Every limit is checked against the headers before the body is read.
+    """
+    upload = uploads.get_or_404(upload_id, current_user)
+    span = parse_content_range_header(request.headers.get('Content-Range'))
+    if span is None or span.units != 'bytes' or span.start is None:
+        abort(400, 'send Content-Range: bytes <first>-<last>/<size>')
+    if span.length is not None and span.length != upload.size:
+        abort(400, f'upload was declared as {upload.size} bytes')
+    length = span.stop - span.start
+    if request.content_length is None:
+        abort(411, 'send Content-Length')
+    if request.content_length != length:
+        abort(400, 'Content-Length does not match Content-Range')
+    if length > current_app.config['UPLOAD_CHUNK_SIZE']:
+        abort(413, f'chunks are limited to {current_app.config["UPLOAD_CHUNK_SIZE"]} bytes')
+    uploads.append(upload, span.start, length, request.stream)
+    return respond({'data': _upload_state(upload)})
+
+
+@bp.route('/uploads/<upload_id>/finalize', methods=['POST'])
+@login_required
+def finalize_upload(upload_id):
+    upload = uploads.finalize(uploads.get_or_404(upload_id, current_user))
+    return respond({'data': _upload_state(upload)})
+
+
+@bp.route('/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def cancel_upload(upload_id):
+    uploads.cancel(uploads.get_or_404(upload_id, current_user))
+    return Response(status=204)
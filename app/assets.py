@@ -0,0 +1,161 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+
+from flask import request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # gzip is always written; .br only when available
+    brotli = None
+
+DIST = 'dist'
+MANIFEST = 'manifest.json'
+# everything under static/ except user content and our own output
+SKIP_DIRS = {'uploads', DIST}
+COMPRESSIBLE = {'.css', '.js', '.svg', '.ico', '.json', '.txt'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_CSS_STRING = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')')
+
+
+def minify_css(source):
+    """Drop comments and collapse whitespace; quoted strings are left alone."""
+    parts = _CSS_STRING.split(source)
+    for i in range(0, len(parts), 2):  # odd indexes are the strings
+        css = re.sub(r'/\*.*?\*/', '', parts[i], flags=re.S)
+        css = re.sub(r'\s+', ' ', css)
+        # only around punctuation where whitespace never matters; ':' keeps
+        # its leading space so descendant selectors like `a :hover` survive
+        css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+        css = re.sub(r':\s+', ':', css)
+        parts[i] = css.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(source):
+    """Conservative: strip indentation, blank lines and whole-line comments.
+
+    Line breaks are kept so automatic semicolon insertion behaves exactly as
+    before, and lines inside multi-line template literals are not touched.
+    """
+    out = []
+    in_template = False
+    for line in source.splitlines():
+        if in_template:
+            out.append(line)
+        else:
+            stripped = line.strip()
+            if not stripped or stripped.startswith('//') or (
+                    stripped.startswith('/*') and stripped.endswith('*/')):
+                continue
+            out.append(stripped)
+        if line.count('`') % 2:
+            in_template = not in_template
+    return '\n'.join(out) + '\n'
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def _write(path, data):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def build(static_folder):
+    """Minify, fingerprint and precompress every static asset.
+
+    Writes static/dist/<name>.<hash><ext> (+ .gz / .br) and a manifest
+    mapping each source path to its built path. Returns the manifest.
+    """
+    dist = os.path.join(static_folder, DIST)
+    shutil.rmtree(dist, ignore_errors=True)
+    manifest = {}
+
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in sorted(files):
+            src = os.path.join(root, name)
+            rel = os.path.relpath(src, static_folder).replace(os.sep, '/')
+            stem, ext = os.path.splitext(rel)
+
+            with open(src, 'rb') as f:
+                data = f.read()
+            if ext in MINIFIERS:
+                data = MINIFIERS[ext](data.decode('utf-8')).encode('utf-8')
+
+            built = f"{DIST}/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            dest = os.path.join(static_folder, built)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            _write(dest, data)
+
+            if ext in COMPRESSIBLE:
+                _write(dest + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write(dest + '.br', brotli.compress(data, quality=11))
+
+            manifest[rel] = built
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def init_app(app):
+    """Resolve url_for('static') through the manifest and serve built files
+    precompressed with far-future headers.
+
+    Without a manifest (no `flask assets build` yet, or debug mode) URLs and
+    serving are unchanged.
+    """
+    manifest = {} if app.debug else load_manifest(app.static_folder)
+    app.extensions['assets'] = manifest
+    if not manifest:
+        return
+
+    @app.url_defaults
+    def fingerprinted_static(endpoint, values):
+        if endpoint == 'static':
+            built = manifest.get(values.get('filename'))
+            if built:
+                values['filename'] = built
+                values.pop('v', None)
+
+    plain_static = app.view_functions['static']
+
+    def static(filename):
+        if not filename.startswith(DIST + '/'):
+            return plain_static(filename=filename)
+
+        accepted = request.accept_encodings
+        response = None
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[encoding] and os.path.exists(os.path.join(app.static_folder, filename + suffix)):
+                response = send_from_directory(
+                    app.static_folder, filename + suffix,
+                    mimetype=mimetypes.guess_type(filename)[0], max_age=31536000,
+                )
+                response.headers['Content-Encoding'] = encoding
+                break
+        if response is None:
+            response = send_from_directory(app.static_folder, filename, max_age=31536000)
+
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
+
+    app.view_functions['static'] = static
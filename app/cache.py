@@ -0,0 +1,300 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from itertools import chain
+from uuid import uuid4
+
+from flask import g, make_response, request, session
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event
+
+from app import db
+
+CSRF_PLACEHOLDER = '__CACHED_CSRF_TOKEN__'
+
+
+class NullBackend:
+    name = 'null'
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class MemoryBackend:
+    """In-process LRU with a per-entry TTL. One copy per worker."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """File-backed store shared by every gunicorn worker on the host."""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)'
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None,
+                                   check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute(
+            'SELECT value, expires FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            return None
+        return json.loads(value)
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + ttl if ttl else None
+        conn = self._conn()
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+            (key, json.dumps(value), expires)
+        )
+        # expired rows are only unreachable, so sweep them now and then
+        if random.random() < 0.01:
+            conn.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+
+    def delete(self, key):
+        self._conn().execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def __len__(self):
+        return self._conn().execute('SELECT count(*) FROM cache').fetchone()[0]
+
+
+def tags_for(obj):
+    """Cache tags a changed model instance invalidates."""
+    from app.models import User, Post, Like, Comment
+
+    if isinstance(obj, Post):
+        return {f'post:{obj.id}', f'user:{obj.user_id}', f'category:{obj.category}'}
+    if isinstance(obj, Comment):
+        return {f'comments:{obj.post_id}', f'post:{obj.post_id}'}
+    if isinstance(obj, Like):
+        return {f'post:{obj.post_id}'}
+    if isinstance(obj, User):
+        return {f'user:{obj.id}'}
+    return set()
+
+
+class Cache:
+    """Tag-versioned cache in front of a pluggable backend.
+
+    Every entry key embeds the current token of each tag it depends on.
+    Invalidating a tag drops its token, so the next lookup mints a fresh
+    one and all entries built on the old token become unreachable. Nothing
+    has to be found and deleted, which keeps invalidation O(tags) and safe
+    across workers sharing one store.
+    """
+
+    def __init__(self):
+        self.backend = NullBackend()
+        self.default_ttl = 60
+        self.hits = 0
+        self.misses = 0
+
+    def init_app(self, app):
+        kind = app.config.get('CACHE_BACKEND', 'memory')
+        if kind == 'memory':
+            self.backend = MemoryBackend(app.config.get('CACHE_MAX_ENTRIES', 2048))
+        elif kind == 'sqlite':
+            self.backend = SQLiteBackend(app.config.get('CACHE_PATH')
+                                         or os.path.join(app.instance_path, 'cache.sqlite'))
+        else:
+            self.backend = NullBackend()
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 60)
+        app.extensions['cache'] = self
+        app.jinja_env.add_extension(FragmentCacheExtension)
+
+        if not event.contains(db.session, 'after_flush', _collect_tags):
+            event.listen(db.session, 'after_flush', _collect_tags)
+            event.listen(db.session, 'after_commit', _invalidate_tags)
+            event.listen(db.session, 'after_rollback', _discard_tags)
+
+    @property
+    def enabled(self):
+        return not isinstance(self.backend, NullBackend)
+
+    def get(self, key):
+        value = self.backend.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl or self.default_ttl)
+
+    def delete(self, key):
+        self.backend.delete(key)
+
+    def _tag_token(self, tag):
+        token = self.backend.get(f'tag:{tag}')
+        if token is None:
+            token = uuid4().hex[:12]
+            self.backend.set(f'tag:{tag}', token)
+        return token
+
+    def key_for(self, name, tags=()):
+        return ':'.join([name] + [self._tag_token(t) for t in sorted(tags)])
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.backend.delete(f'tag:{tag}')
+
+    def fragment(self, name, tags, render, ttl=None):
+        if not self.enabled:
+            return render()
+        key = self.key_for(f'frag:{name}', tags)
+        value = self.get(key)
+        if value is None:
+            value = render()
+            self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': self.backend.name,
+            'entries': len(self.backend),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+cache = Cache()
+
+
+def _collect_tags(session, flush_context):
+    tags = session.info.setdefault('cache_tags', set())
+    for obj in chain(session.new, session.dirty, session.deleted):
+        tags.update(tags_for(obj))
+
+
+def _invalidate_tags(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        cache.invalidate(*tags)
+
+
+def _discard_tags(session):
+    session.info.pop('cache_tags', None)
+
+
+def cached_page(tags=None, ttl=None):
+    """Serve a GET view from the cache for anonymous visitors.
+
+    `tags(**view_args)` names what the page depends on. The per-session
+    CSRF token is swapped for a placeholder before storing and filled back
+    in on every hit, so cached forms still validate.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if (not cache.enabled or request.method != 'GET'
+                    or current_user.is_authenticated or session.get('_flashes')):
+                return view(**kwargs)
+
+            key = cache.key_for(f'page:{request.full_path}', tags(**kwargs) if tags else ())
+            body = cache.get(key)
+            if body is not None:
+                return make_response(body.replace(CSRF_PLACEHOLDER, generate_csrf()))
+
+            response = make_response(view(**kwargs))
+            if response.status_code == 200 and response.mimetype == 'text/html':
+                body = response.get_data(as_text=True)
+                token = g.get('csrf_token')
+                if token:
+                    body = body.replace(token, CSRF_PLACEHOLDER)
+                cache.set(key, body, ttl)
+            return response
+        return wrapper
+    return decorator
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache "name", ["tag", ...] %} ... {% endcache %}"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.List([]))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, name, tags, caller):
+        return Markup(cache.fragment(name, tags, caller))
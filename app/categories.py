@@ -0,0 +1,95 @@
+"""Category pages and the per-category counters behind the nav.
+
+category_stat holds one row per category with its post count and newest
+post date. A flush hook keeps it current as posts are added and deleted,
+so the nav and page headers never count posts.
+"""
+from sqlalchemy import case, event, func, select
+
+from app import db
+from app.cache import cache
+from app.feed import feed_page
+from app.forms import CATEGORIES
+from app.models import CategoryStat, Post, insert_ignore
+
+STATS_TAG = 'categories'
+
+
+# ---------------- COUNTERS ----------------
+def _post_added(conn, post):
+    table = CategoryStat.__table__
+    conn.execute(insert_ignore(table).values(category=post.category, post_count=0))
+    newest = table.c.last_posted_at
+    conn.execute(table.update().where(table.c.category == post.category).values(
+        post_count=table.c.post_count + 1,
+        last_posted_at=case((newest.is_(None) | (newest < post.date_posted), post.date_posted),
+                            else_=newest),
+    ))
+
+
+def _post_removed(conn, post):
+    table = CategoryStat.__table__
+    conn.execute(table.update().where(table.c.category == post.category).values(
+        post_count=table.c.post_count - 1,
+        # one probe of the (category, date_posted) index
+        last_posted_at=select(func.max(Post.date_posted))
+        .where(Post.category == post.category).scalar_subquery(),
+    ))
+
+
+def _count_posts(session, flush_context):
+    # runs inside every flush, so each way of adding or deleting a post is counted
+    added = [o for o in session.new if isinstance(o, Post) and o.category]
+    removed = [o for o in session.deleted if isinstance(o, Post) and o.category]
+    if not added and not removed:
+        return
+    conn = session.connection()
+    for post in added:
+        _post_added(conn, post)
+    for post in removed:
+        _post_removed(conn, post)
+    # dropped with the model cache tags once the transaction commits
+    session.info.setdefault('cache_tags', set()).add(STATS_TAG)
+
+
+def rebuild():
+    """Recount every category from the post table; returns the number of categories."""
+    table = CategoryStat.__table__
+    db.session.execute(table.delete())
+    counted = (select(Post.category, func.count(Post.id), func.max(Post.date_posted))
+               .where(Post.category.isnot(None))
+               .group_by(Post.category))
+    written = db.session.execute(
+        table.insert().from_select(['category', 'post_count', 'last_posted_at'], counted)
+    ).rowcount
+    db.session.commit()
+    cache.invalidate(STATS_TAG)
+    return written
+
+
+# ---------------- READING ----------------
+def category_stats():
+    """[(category, post count)] for the nav, in menu order.
+
+    Cached until a post is added or removed, so most pages skip even the
+    small category_stat query.
+    """
+    key = cache.key_for('category-stats', [STATS_TAG])
+    counts = cache.get(key) if cache.enabled else None
+    if counts is None:
+        counts = dict(db.session.execute(
+            select(CategoryStat.category, CategoryStat.post_count)).all())
+        if cache.enabled:
+            cache.set(key, counts)
+    return [(name, counts.get(name, 0)) for name in CATEGORIES]
+
+
+def category_page(category, cursor=None):
+    """One keyset page of a category, newest first, over (category, date_posted)."""
+    return feed_page(Post.query.filter(Post.category == category), cursor=cursor)
+
+
+def init_app(app):
+    app.add_template_global(category_stats)
+    if not event.contains(db.session, 'after_flush', _count_posts):
+        event.listen(db.session, 'after_flush', _count_posts)
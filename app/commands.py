@@ -0,0 +1,152 @@
+import time
+from datetime import timedelta
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+
+from app import db
+from app.models import User, Post, Like, Comment, followers
+from app import assets, categories, suggestions, timeline, trending, uploads
+from app.search import search_backend
+from app.storage import collect_garbage
+
+
+@click.command('recount')
+@with_appcontext
+def recount_command():
+    """Rebuild the denormalized like/comment/follower and category counters in bulk."""
+    Post.query.update({
+        Post.like_count: select(func.count(Like.id))
+        .where(Like.post_id == Post.id).scalar_subquery(),
+        Post.comment_count: select(func.count(Comment.id))
+        .where(Comment.post_id == Post.id).scalar_subquery(),
+    }, synchronize_session=False)
+
+    User.query.update({
+        User.follower_count: select(func.count())
+        .select_from(followers)
+        .where(followers.c.followed_id == User.id).scalar_subquery(),
+        User.following_count: select(func.count())
+        .select_from(followers)
+        .where(followers.c.follower_id == User.id).scalar_subquery(),
+    }, synchronize_session=False)
+
+    db.session.commit()
+    categories.rebuild()
+    click.echo('Counters rebuilt.')
+
+
+@click.command('search-reindex')
+@with_appcontext
+def search_reindex_command():
+    """Rebuild the full-text search index from the post and user tables."""
+    search_backend().rebuild()
+    click.echo('Search index rebuilt.')
+
+
+@click.command('storage-gc')
+@click.option('--grace', type=int, default=None,
+              help='Seconds a blob must have been unreferenced (default STORAGE_GC_GRACE).')
+@with_appcontext
+def storage_gc_command(grace):
+    """Delete uploaded files that no post or profile references any more.
+
+    Chunked uploads left unclaimed for UPLOAD_SESSION_TTL are dropped too.
+    """
+    if grace is None:
+        grace = current_app.config['STORAGE_GC_GRACE']
+    removed = collect_garbage(timedelta(seconds=grace))
+    expired = uploads.expire(timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL']))
+    click.echo(f'Removed {removed} unreferenced blob(s) and {expired} abandoned upload(s).')
+
+
+@click.command('timeline-rebuild')
+@with_appcontext
+def timeline_rebuild_command():
+    """Recompute every user's following timeline from the follow graph."""
+    written = timeline.rebuild()
+    click.echo(f'Wrote {written} timeline entries.')
+
+
+@click.command('trending-refresh')
+@click.option('--every', type=int, default=None,
+              help='Keep running and refresh every this many seconds.')
+@with_appcontext
+def trending_refresh_command(every):
+    """Recompute the trending lists from recent likes and comments."""
+    while True:
+        started = time.perf_counter()
+        written = trending.refresh()
+        click.echo(f'Ranked {written} trending entries in {time.perf_counter() - started:.2f}s.')
+        if not every:
+            return
+        db.session.remove()
+        time.sleep(every)
+
+
+@click.command('suggestions-refresh')
+@click.option('--full', is_flag=True, help='Recompute every user, not just those whose follows changed.')
+@click.option('--every', type=int, default=None,
+              help='Keep running: one full pass, then an incremental one every this many seconds.')
+@with_appcontext
+def suggestions_refresh_command(full, every):
+    """Recompute "who to follow" suggestions from the follow graph and likes."""
+    full = full or bool(every)
+    while True:
+        started = time.perf_counter()
+        users, written = suggestions.refresh(full=full)
+        click.echo(f'Wrote {written} suggestion(s) for {users} user(s) '
+                   f'in {time.perf_counter() - started:.2f}s.')
+        if not every:
+            return
+        full = False
+        db.session.remove()
+        time.sleep(every)
+
+
+@click.command('replica-sync')
+@with_appcontext
+def replica_sync_command():
+    """Copy a SQLite primary over its replicas (for trying replica routing locally)."""
+    replicas = current_app.extensions.get('replicas')
+    if not replicas:
+        raise click.ClickException('No DATABASE_REPLICA_URLS configured.')
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('Only SQLite replicas can be synced; use real replication.')
+    source = db.engine.raw_connection()
+    try:
+        for key in replicas:
+            target = db.engines[key].raw_connection()
+            try:
+                source.driver_connection.backup(target.driver_connection)
+            finally:
+                target.close()
+    finally:
+        source.close()
+    click.echo(f'Copied the primary to {len(replicas)} replica(s).')
+
+
+@click.group('assets')
+def assets_group():
+    """Static asset pipeline."""
+
+
+@assets_group.command('build')
+@with_appcontext
+def assets_build_command():
+    """Minify, fingerprint and precompress static files into static/dist."""
+    manifest = assets.build(current_app.static_folder)
+    click.echo(f'Built {len(manifest)} asset(s); restart the app to serve them.')
+
+
+def init_app(app):
+    app.cli.add_command(recount_command)
+    app.cli.add_command(search_reindex_command)
+    app.cli.add_command(storage_gc_command)
+    app.cli.add_command(assets_group)
+    app.cli.add_command(timeline_rebuild_command)
+    app.cli.add_command(replica_sync_command)
+    app.cli.add_command(trending_refresh_command)
+    app.cli.add_command(suggestions_refresh_command)
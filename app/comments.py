@@ -0,0 +1,61 @@
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from app.feed import after_cursor, encode_cursor
+from app.models import Comment
+
+COMMENT_THREADS_PER_PAGE = 20
+
+
+class CommentPage:
+    def __init__(self, threads, next_cursor):
+        self.threads = threads
+        self.next_cursor = next_cursor
+
+
+def load_comment_page(post_id, cursor=None, limit=COMMENT_THREADS_PER_PAGE):
+    """Load one page of top-level comments with their whole reply trees.
+
+    Two queries regardless of thread size: one for the page of roots, one
+    recursive CTE for every descendant of those roots. Authors are joined
+    in both. Each returned comment gets a `children` list (oldest first)
+    so templates never touch the lazy `replies` relationship.
+    """
+    roots = (Comment.query
+             .options(joinedload(Comment.comment_author))
+             .filter(Comment.post_id == post_id, Comment.parent_id.is_(None)))
+    roots = after_cursor(roots, Comment.date_posted, Comment.id, cursor)
+    roots = (roots.order_by(Comment.date_posted.desc(), Comment.id.desc())
+             .limit(limit + 1)
+             .all())
+
+    next_cursor = None
+    if len(roots) > limit:
+        roots = roots[:limit]
+        last = roots[-1]
+        next_cursor = encode_cursor(last.date_posted, last.id)
+
+    replies = []
+    if roots:
+        tree = (select(Comment.id)
+                .where(Comment.post_id == post_id,
+                       Comment.parent_id.in_([c.id for c in roots]))
+                .cte('comment_tree', recursive=True))
+        tree = tree.union_all(
+            select(Comment.id).where(Comment.post_id == post_id,
+                                     Comment.parent_id == tree.c.id)
+        )
+        replies = (Comment.query
+                   .options(joinedload(Comment.comment_author))
+                   .filter(Comment.id.in_(select(tree.c.id)))
+                   .order_by(Comment.date_posted, Comment.id)
+                   .all())
+
+    by_id = {}
+    for comment in roots + replies:
+        comment.children = []
+        by_id[comment.id] = comment
+    for reply in replies:
+        by_id[reply.parent_id].children.append(reply)
+
+    return CommentPage(roots, next_cursor)
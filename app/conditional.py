@@ -0,0 +1,76 @@
+import hashlib
+import os
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from werkzeug.http import is_resource_modified
+
+
+def latest(*stamps):
+    """Newest of the given datetimes, ignoring NULLs."""
+    stamps = [s for s in stamps if s is not None]
+    return max(stamps) if stamps else None
+
+
+def _viewer():
+    # the page embeds who is looking (nav, follow buttons, owner controls)
+    # and their CSRF token, so both are part of every validator
+    parts = [session.get('csrf_token')]
+    if current_user.is_authenticated:
+        parts += [current_user.id, current_user.updated_at]
+    return parts
+
+
+def conditional(state):
+    """Answer If-None-Match / If-Modified-Since with 304 before rendering.
+
+    `state(**view_args)` returns (parts, last_modified) from a cheap query
+    over the rows the page shows, or None to skip validation (e.g. a 404).
+    The weak ETag hashes those parts together with the viewer and the
+    template build, so it changes whenever the rendered page could.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(**kwargs)
+
+            validator = state(**kwargs)
+            if validator is None:
+                return view(**kwargs)
+            parts, last_modified = validator
+
+            raw = repr([current_app.extensions['build_id'], request.full_path,
+                        list(parts), _viewer()])
+            etag = hashlib.sha1(raw.encode()).hexdigest()
+
+            if is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = make_response(view(**kwargs))
+                if response.status_code != 200:
+                    return response
+            else:
+                response = current_app.response_class(status=304)
+
+            response.set_etag(etag, weak=True)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+
+def init_app(app):
+    """Fingerprint the code, templates and built assets so a deploy
+    invalidates every ETag."""
+    digest = hashlib.sha1(repr(sorted(app.extensions.get('assets', {}).items())).encode())
+    for root, dirs, files in os.walk(app.root_path):
+        dirs[:] = sorted(d for d in dirs if d not in ('static', '__pycache__'))
+        for name in sorted(files):
+            if name.endswith(('.py', '.html')):
+                with open(os.path.join(root, name), 'rb') as f:
+                    digest.update(f.read())
+    app.extensions['build_id'] = digest.hexdigest()[:12]
@@ -0,0 +1,138 @@
+import os
+
+
+def _int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def database_url():
+    url = os.environ.get("DATABASE_URL")
+    if url and url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url or "sqlite:///../instance/coolstack.db"
+
+
+def request_concurrency():
+    """Requests one worker process serves at once, from the same variables
+    gunicorn.conf.py reads."""
+    worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+    if worker_class == 'gevent':
+        return _int('GUNICORN_WORKER_CONNECTIONS', 100)
+    if worker_class == 'gthread':
+        return _int('GUNICORN_THREADS', 4)
+    return 1
+
+
+def engine_options(url, concurrency, task_workers):
+    """SQLALCHEMY_ENGINE_OPTIONS sized for one worker process.
+
+    Every request thread/greenlet and every background task thread may hold
+    a connection, so that is the default pool size (greenlets are capped at
+    20; beyond that they queue on pool_timeout). Connections are
+    pre-pinged and recycled so a database failover or an idle-timeout on a
+    proxy does not surface as a 500.
+    """
+    options = {
+        'pool_pre_ping': True,
+        'pool_recycle': _int('DB_POOL_RECYCLE', 1800),
+    }
+    if url.startswith('sqlite'):
+        return options
+
+    options['pool_size'] = _int('DB_POOL_SIZE', min(concurrency, 20) + task_workers)
+    options['max_overflow'] = _int('DB_MAX_OVERFLOW', 5)
+    options['pool_timeout'] = _int('DB_POOL_TIMEOUT', 10)
+    if url.startswith('postgresql'):
+        timeout = _int('DB_STATEMENT_TIMEOUT_MS', 15000)
+        options['connect_args'] = {'options': f'-c statement_timeout={timeout}'}
+    return options
+
+
+class Config:
+    """Every setting, read from the environment when the app is created."""
+
+    def __init__(self, app):
+        self.SECRET_KEY = os.environ.get('SECRET_KEY', 'your_secret_key')
+        self.SQLALCHEMY_DATABASE_URI = database_url()
+        self.SQLALCHEMY_TRACK_MODIFICATIONS = False
+        self.WTF_CSRF_TIME_LIMIT = None
+
+        self.UPLOAD_FOLDER = os.path.join(app.root_path, 'static', 'uploads')
+        self.UPLOAD_TMP_FOLDER = (os.environ.get('UPLOAD_TMP_FOLDER')
+                                  or os.path.join(app.instance_path, 'upload_tmp'))
+        self.STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')  # local | s3
+        self.STORAGE_S3_BUCKET = os.environ.get('STORAGE_S3_BUCKET')
+        self.STORAGE_S3_ENDPOINT = os.environ.get('STORAGE_S3_ENDPOINT')  # e.g. a local MinIO
+        self.STORAGE_S3_PUBLIC_URL = os.environ.get('STORAGE_S3_PUBLIC_URL')
+        self.STORAGE_S3_REGION = os.environ.get('STORAGE_S3_REGION')
+        self.STORAGE_GC_GRACE = _int('STORAGE_GC_GRACE', 3600)
+        # whole request bodies; bigger files go through the chunked upload API
+        self.MAX_CONTENT_LENGTH = _int('MAX_CONTENT_LENGTH', 32 * 1024 * 1024)
+        self.UPLOAD_MAX_IMAGE_BYTES = _int('UPLOAD_MAX_IMAGE_BYTES', 20 * 1024 * 1024)
+        self.UPLOAD_MAX_VIDEO_BYTES = _int('UPLOAD_MAX_VIDEO_BYTES', 1024 * 1024 * 1024)
+        self.UPLOAD_CHUNK_SIZE = _int('UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+        self.UPLOAD_SESSION_TTL = _int('UPLOAD_SESSION_TTL', 24 * 3600)  # seconds an unfinished upload is kept
+        # hand video bodies to the front server: '' (serve here) | x-sendfile | x-accel
+        self.MEDIA_SENDFILE = os.environ.get('MEDIA_SENDFILE', '')
+        self.MEDIA_ACCEL_PREFIX = os.environ.get('MEDIA_ACCEL_PREFIX', '/_protected/uploads/')  # nginx internal location
+
+        self.SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+        self.CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')  # memory | sqlite | null
+        self.CACHE_PATH = os.environ.get('CACHE_PATH')
+        self.CACHE_DEFAULT_TTL = _int('CACHE_DEFAULT_TTL', 60)
+        self.CACHE_MAX_ENTRIES = _int('CACHE_MAX_ENTRIES', 2048)
+        self.LOGIN_CACHE_TTL = _int('LOGIN_CACHE_TTL', 30)  # seconds load_user may serve a cached principal
+        self.TASK_WORKERS = _int('TASK_WORKERS', 2)
+        self.TIMELINE_CELEBRITY_FOLLOWERS = _int('TIMELINE_CELEBRITY_FOLLOWERS', 5000)
+        self.TIMELINE_BACKFILL = _int('TIMELINE_BACKFILL', 100)
+        self.TRENDING_HALF_LIFE_HOURS = float(os.environ.get('TRENDING_HALF_LIFE_HOURS', 12))
+        self.TRENDING_WINDOW_HOURS = _int('TRENDING_WINDOW_HOURS', 72)
+        self.TRENDING_SIZE = _int('TRENDING_SIZE', 500)  # posts kept per list
+        self.SUGGESTIONS_PER_USER = _int('SUGGESTIONS_PER_USER', 20)
+
+        self.DEBUG_ENDPOINTS = os.environ.get('DEBUG_ENDPOINTS') == '1'
+        self.PERF_SAMPLE_RATE = float(os.environ.get('PERF_SAMPLE_RATE', 0))  # 0..1
+        self.PERF_NPLUS1_THRESHOLD = _int('PERF_NPLUS1_THRESHOLD', 5)
+
+        self.REQUEST_CONCURRENCY = request_concurrency()
+        self.SQLALCHEMY_ENGINE_OPTIONS = engine_options(
+            self.SQLALCHEMY_DATABASE_URI, self.REQUEST_CONCURRENCY, self.TASK_WORKERS
+        )
+
+        # comma separated; read-only views spread their reads across these
+        replicas = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',')
+                    if url.strip()]
+        self.SQLALCHEMY_BINDS = {
+            f'replica{i}': {'url': url, **engine_options(url, self.REQUEST_CONCURRENCY, 0)}
+            for i, url in enumerate(replicas, 1)
+        }
+        self.REPLICA_STICKY_SECONDS = _int('REPLICA_STICKY_SECONDS', 10)
+
+        self.REALTIME_BROKER = os.environ.get('REALTIME_BROKER', 'local')  # local | redis
+        self.REALTIME_REDIS_URL = os.environ.get('REALTIME_REDIS_URL') or os.environ.get('REDIS_URL')
+        self.REALTIME_MAX_STREAMS = _int('REALTIME_MAX_STREAMS', self.REQUEST_CONCURRENCY // 2)
+        self.REALTIME_STREAM_SECONDS = _int('REALTIME_STREAM_SECONDS', 300)
+
+        self.LIKE_WRITE_BEHIND = os.environ.get('LIKE_WRITE_BEHIND', 'off')  # off | memory | sqlite
+        self.LIKE_FLUSH_INTERVAL = float(os.environ.get('LIKE_FLUSH_INTERVAL', 1.0))
+        self.LIKE_BUFFER_PATH = (os.environ.get('LIKE_BUFFER_PATH')
+                                 or os.path.join(app.instance_path, 'like_buffer.sqlite'))
+        self.LIKE_BUFFER_SYNC = os.environ.get('LIKE_BUFFER_SYNC', 'normal')  # normal | full
+
+
+def check_pool(app):
+    """Warn at startup when requests could wait on the connection pool."""
+    options = app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    if 'pool_size' not in options:
+        return
+    capacity = options['pool_size'] + options.get('max_overflow', 0)
+    needed = app.config['REQUEST_CONCURRENCY'] + app.config['TASK_WORKERS']
+    if capacity < needed:
+        app.logger.warning(
+            'DB pool holds %d connections (pool_size %d + max_overflow %d) but each '
+            'worker runs up to %d requests plus %d task threads; the rest will wait '
+            'up to %ss for a connection. Raise DB_POOL_SIZE or lower the concurrency.',
+            capacity, options['pool_size'], options.get('max_overflow', 0),
+            app.config['REQUEST_CONCURRENCY'], app.config['TASK_WORKERS'],
+            options.get('pool_timeout'),
+        )
@@ -0,0 +1,70 @@
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
+
+from app.models import Post
+
+FEED_PAGE_SIZE = 20
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(posted_at, row_id):
+    """Pack a (date_posted, id) position into an opaque URL-safe token."""
+    raw = f"{posted_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """Reverse of encode_cursor; raises InvalidCursor on garbage."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        posted_at, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(posted_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(token)
+
+
+def after_cursor(query, date_col, id_col, cursor):
+    """Restrict a newest-first query to rows strictly after `cursor`."""
+    if not cursor:
+        return query
+    posted_at, row_id = decode_cursor(cursor)
+    return query.filter(or_(
+        date_col < posted_at,
+        and_(date_col == posted_at, id_col < row_id),
+    ))
+
+
+class FeedPage:
+    def __init__(self, posts, next_cursor):
+        self.posts = posts
+        self.next_cursor = next_cursor
+
+
+def feed_page(query=None, cursor=None, limit=FEED_PAGE_SIZE):
+    """Return one keyset-paginated page of posts, newest first.
+
+    Authors are joined in the same query and like/comment totals are plain
+    columns on Post, so rendering a page costs a fixed number of queries no
+    matter how many posts it holds.
+    """
+    if query is None:
+        query = Post.query
+    query = after_cursor(query, Post.date_posted, Post.id, cursor)
+    posts = (query.options(joinedload(Post.author))
+             .order_by(Post.date_posted.desc(), Post.id.desc())
+             .limit(limit + 1)
+             .all())
+
+    next_cursor = None
+    if len(posts) > limit:
+        posts = posts[:limit]
+        last = posts[-1]
+        next_cursor = encode_cursor(last.date_posted, last.id)
+
+    return FeedPage(posts, next_cursor)
@@ -1,5 +1,5 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, TextAreaField, BooleanField, FileField, SelectField, DateField, RadioField
+from wtforms import StringField, PasswordField, SubmitField, TextAreaField, BooleanField, FileField, SelectField, DateField, RadioField, HiddenField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, Regexp, NumberRange, Optional
 from flask_wtf.file import FileAllowed
 
@@ -17,17 +17,18 @@ class LoginForm(FlaskForm):
     remember = BooleanField('Remember Me')
     submit = SubmitField('Login')
 
+CATEGORIES = ['Technology', 'Lifestyle', 'Education', 'Sports',
+              'Entertainment', 'Business', 'Art', 'Science']
+
 class PostForm(FlaskForm):
     title = StringField('Title', validators=[DataRequired()])
     content = TextAreaField('Content', validators=[DataRequired()])
-    category = SelectField('Category', choices=[
-        ('Technology', 'Technology'), ('Lifestyle', 'Lifestyle'),
-        ('Education', 'Education'), ('Sports', 'Sports'),
-        ('Entertainment', 'Entertainment'), ('Business', 'Business'),
-        ('Art', 'Art'), ('Science', 'Science')
-    ])
+    category = SelectField('Category', choices=[(c, c) for c in CATEGORIES])
     image = FileField("Image", validators=[FileAllowed(["jpg", "jpeg", "png", "webp"], "Images only!")])
     video = FileField("Video", validators=[FileAllowed(["mp4", "mov", "webm"], "Video files only!")])
+    # ids from the chunked upload API (app.uploads), used instead of the file fields
+    image_upload = HiddenField()
+    video_upload = HiddenField()
     submit = SubmitField('Post')
 
 class EditProfileForm(FlaskForm):
@@ -44,6 +45,8 @@ class EditProfileForm(FlaskForm):
 
     profile_pic = FileField('Profile Picture', validators=[Optional(), FileAllowed(['jpg', 'png', 'jpeg'])])
     cover_photo = FileField('Cover Photo', validators=[Optional(), FileAllowed(['jpg', 'png', 'jpeg'])])
+    profile_pic_upload = HiddenField()
+    cover_photo_upload = HiddenField()
 
     submit = SubmitField('Save Changes')
 
@@ -0,0 +1,287 @@
+"""Write-behind buffer for like toggles (LIKE_WRITE_BEHIND).
+
+A click records the user's *desired* state for (user, post) in a small
+SQLite store instead of writing the Like table. A background thread per
+worker flushes the store every LIKE_FLUSH_INTERVAL seconds with one bulk
+INSERT and one bulk DELETE, then bumps the post counters. Because entries
+are desired states, a like followed by an unlike coalesces into nothing,
+and replaying an entry after a crash is harmless.
+
+Modes:
+
+  off     (default) every click writes and commits straight away
+  memory  the store is per process; toggles not yet flushed are lost if the
+          worker dies (a graceful shutdown flushes)
+  sqlite  the store is LIKE_BUFFER_PATH, shared by the host's workers, so
+          a toggle survives a worker crash. LIKE_BUFFER_SYNC=full also
+          fsyncs every toggle so it survives power loss.
+"""
+import atexit
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from uuid import uuid4
+
+from flask import current_app
+from sqlalchemy import bindparam, tuple_
+
+from app import db
+
+log = logging.getLogger(__name__)
+
+FLUSH_BATCH = 5000
+CLAIM_TIMEOUT = 60  # seconds before a flusher that died mid-batch is presumed dead
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS pending_like ('
+    ' user_id INTEGER NOT NULL, post_id INTEGER NOT NULL,'
+    ' liked INTEGER NOT NULL,'   # what the user wants
+    ' base INTEGER NOT NULL,'    # what the Like table held when buffered
+    ' seq INTEGER NOT NULL DEFAULT 0,'
+    ' claimed TEXT, claimed_at REAL,'
+    ' PRIMARY KEY (user_id, post_id))',
+    'CREATE INDEX IF NOT EXISTS pending_like_post ON pending_like (post_id)',
+    'CREATE INDEX IF NOT EXISTS pending_like_claim ON pending_like (claimed)',
+)
+
+
+class LikeBuffer:
+    def __init__(self, app, path=':memory:', sync='normal'):
+        self.app = app
+        self._lock = threading.Lock()
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None,
+                                     check_same_thread=False)
+        if path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(f"PRAGMA synchronous={'FULL' if sync == 'full' else 'NORMAL'}")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._stop = threading.Event()
+        self._thread = None
+
+    # ---------------- request side ----------------
+    def set(self, user_id, post_id, liked=None):
+        """Record a like (True), unlike (False) or toggle (None); returns the new state."""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT liked, base FROM pending_like WHERE user_id = ? AND post_id = ?',
+                (user_id, post_id)
+            ).fetchone()
+        if row is None:
+            from app.models import Like
+            base = db.session.execute(db.select(Like.id).where(
+                Like.user_id == user_id, Like.post_id == post_id
+            ).limit(1)).first() is not None
+        else:
+            base = bool(row[1])
+        if liked is None:
+            liked = not (bool(row[0]) if row else base)
+
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO pending_like (user_id, post_id, liked, base) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT (user_id, post_id) DO UPDATE SET '
+                'liked = excluded.liked, seq = seq + 1',
+                (user_id, post_id, int(liked), int(base))
+            )
+        self._ensure_flusher()
+        return liked
+
+    def pending_deltas(self, post_ids):
+        """{post_id: change to like_count not yet flushed} for these posts."""
+        ids = list(post_ids)
+        if not ids:
+            return {}
+        marks = ','.join('?' * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT post_id, SUM(liked - base) FROM pending_like '
+                f'WHERE post_id IN ({marks}) GROUP BY post_id', ids
+            ).fetchall()
+        return {post_id: delta for post_id, delta in rows if delta}
+
+    def pending_states(self, user_id, post_ids):
+        """{post_id: liked} for this user's toggles not yet flushed."""
+        ids = list(post_ids)
+        if not ids:
+            return {}
+        marks = ','.join('?' * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f'SELECT post_id, liked FROM pending_like '
+                f'WHERE user_id = ? AND post_id IN ({marks})', [user_id] + ids
+            ).fetchall()
+        return {post_id: bool(liked) for post_id, liked in rows}
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT count(*) FROM pending_like').fetchone()[0]
+
+    # ---------------- flushing ----------------
+    def _claim(self):
+        token = uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'UPDATE pending_like SET claimed = ?, claimed_at = ? WHERE rowid IN ('
+                ' SELECT rowid FROM pending_like WHERE claimed IS NULL OR claimed_at < ?'
+                ' LIMIT ?)',
+                (token, now, now - CLAIM_TIMEOUT, FLUSH_BATCH)
+            )
+            rows = self._conn.execute(
+                'SELECT user_id, post_id, liked, seq FROM pending_like WHERE claimed = ?', (token,)
+            ).fetchall()
+        return token, rows
+
+    def _release(self, token, rows, applied):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            if applied:
+                # entries untouched since the claim are done; newer toggles
+                # stay queued, measured against what was just written
+                self._conn.executemany(
+                    'DELETE FROM pending_like WHERE user_id = ? AND post_id = ? AND seq = ?',
+                    [(u, p, seq) for u, p, _, seq in rows]
+                )
+                self._conn.executemany(
+                    'UPDATE pending_like SET base = ? WHERE user_id = ? AND post_id = ?',
+                    [(liked, u, p) for u, p, liked, _ in rows]
+                )
+            self._conn.execute('UPDATE pending_like SET claimed = NULL WHERE claimed = ?', (token,))
+            self._conn.execute('COMMIT')
+
+    def flush(self):
+        """Write one batch of buffered toggles to the database; returns its size."""
+        token, rows = self._claim()
+        if not rows:
+            return 0
+        with self.app.app_context():
+            try:
+                deltas = _apply(rows)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self._release(token, rows, applied=False)
+                log.exception('like buffer flush failed; %d toggle(s) stay queued', len(rows))
+                return 0
+            self._release(token, rows, applied=True)
+            _announce(deltas)
+        return len(rows)
+
+    def flush_all(self):
+        while self.flush() == FLUSH_BATCH:
+            pass
+
+    def _ensure_flusher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                                                name='coolstack-like-flush')
+                self._thread.start()
+
+    def _run(self):
+        interval = self.app.config['LIKE_FLUSH_INTERVAL']
+        while not self._stop.wait(interval):
+            try:
+                self.flush_all()
+            except Exception:
+                log.exception('like buffer flusher error')
+
+    def close(self):
+        """Stop the flusher and write out whatever is still buffered."""
+        self._stop.set()
+        try:
+            self.flush_all()
+        except Exception:
+            log.exception('could not flush the like buffer at shutdown')
+
+
+def _apply(rows):
+    """Bring the Like table to the wanted states; returns {post_id: count delta}."""
+    from app import suggestions
+    from app.models import Like, Post, insert_ignore
+
+    table = Like.__table__
+    dialect = db.session.get_bind().dialect
+    adds = sorted((p, u) for u, p, liked, _ in rows if liked)
+    removes = sorted((p, u) for u, p, liked, _ in rows if not liked)
+    deltas = Counter()
+
+    if adds:
+        params = [{'user_id': u, 'post_id': p} for p, u in adds]
+        if dialect.insert_executemany_returning and dialect.name != 'mysql':
+            stmt = insert_ignore(table).returning(table.c.post_id)
+            for post_id in db.session.execute(stmt, params).scalars():
+                deltas[post_id] += 1
+        else:
+            for row in params:
+                deltas[row['post_id']] += db.session.execute(
+                    insert_ignore(table).values(**row)).rowcount
+    if removes:
+        pairs = [(u, p) for p, u in removes]
+        stmt = table.delete().where(tuple_(table.c.user_id, table.c.post_id).in_(pairs))
+        if dialect.delete_returning:
+            for post_id in db.session.execute(stmt.returning(table.c.post_id)).scalars():
+                deltas[post_id] -= 1
+        else:
+            for u, p in pairs:
+                deltas[p] -= db.session.execute(table.delete().where(
+                    table.c.user_id == u, table.c.post_id == p)).rowcount
+
+    suggestions.mark_changed(*{u for u, _, _, _ in rows})
+
+    changed = [{'b_id': pid, 'b_delta': d} for pid, d in sorted(deltas.items()) if d]
+    if changed:
+        posts = Post.__table__
+        db.session.execute(
+            posts.update().where(posts.c.id == bindparam('b_id'))
+            .values(like_count=posts.c.like_count + bindparam('b_delta')),
+            changed
+        )
+    return {pid: d for pid, d in deltas.items() if d}
+
+
+def _announce(deltas):
+    # the Like/Post writes were Core statements, so tell the cache and the
+    # live stream by hand
+    if not deltas:
+        return
+    from app import realtime
+    from app.cache import cache
+    from app.models import Post
+
+    cache.invalidate(*(f'post:{pid}' for pid in deltas))
+    counts = db.session.execute(
+        db.select(Post.id, Post.like_count).where(Post.id.in_(list(deltas)))
+    ).all()
+    for post_id, like_count in counts:
+        realtime.publish(f'post:{post_id}', post=post_id, like_count=like_count)
+
+
+_buffer = None
+_buffer_pid = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer():
+    """This process's buffer, or None when LIKE_WRITE_BEHIND is off."""
+    global _buffer, _buffer_pid
+    app = current_app._get_current_object()
+    mode = app.config['LIKE_WRITE_BEHIND']
+    if mode == 'off':
+        return None
+    # created after gunicorn forks, like the task pool
+    with _buffer_lock:
+        if _buffer is None or _buffer_pid != os.getpid() or _buffer.app is not app:
+            path = app.config['LIKE_BUFFER_PATH'] if mode == 'sqlite' else ':memory:'
+            _buffer = LikeBuffer(app, path, app.config['LIKE_BUFFER_SYNC'])
+            _buffer_pid = os.getpid()
+            atexit.register(_buffer.close)
+        return _buffer
@@ -0,0 +1,184 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+from flask import current_app, url_for
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.models import User, Post
+from app import tasks
+from app.storage import acquire_blob, get_storage
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # variants are an optimisation; originals still work
+    Image = None
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# kind -> (allowed extensions, config key of its size cap)
+UPLOAD_KINDS = {
+    'post_images': ({'.jpg', '.jpeg', '.png', '.webp'}, 'UPLOAD_MAX_IMAGE_BYTES'),
+    'post_videos': ({'.mp4', '.mov', '.webm'}, 'UPLOAD_MAX_VIDEO_BYTES'),
+    'profile_pics': ({'.jpg', '.jpeg', '.png'}, 'UPLOAD_MAX_IMAGE_BYTES'),
+    'cover_photos': ({'.jpg', '.jpeg', '.png'}, 'UPLOAD_MAX_IMAGE_BYTES'),
+}
+
+# variant name -> (max width, square crop)
+VARIANTS = {
+    'post_images': {'card': (680, False), 'full': (1600, False)},
+    'profile_pics': {'64': (64, True), '128': (128, True)},
+    'cover_photos': {'cover': (1500, False)},
+}
+
+
+def max_upload_size(kind):
+    """Largest file, in bytes, accepted for `kind`."""
+    return current_app.config[UPLOAD_KINDS[kind][1]]
+
+
+def hash_file(path):
+    """Hex sha256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def save_upload(file_storage, kind):
+    """Store an upload under its content hash and return its name within `kind`.
+
+    The body is streamed to a temp file in chunks while being hashed, so
+    identical uploads end up as one stored file with a higher refcount.
+    """
+    if not file_storage or file_storage.filename == "":
+        return None
+
+    ext = os.path.splitext(secure_filename(file_storage.filename))[1].lower()
+    tmp_dir = current_app.config['UPLOAD_TMP_FOLDER']
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    digest = hashlib.sha256()
+    size = 0
+    limit = max_upload_size(kind)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    with os.fdopen(fd, 'wb') as out:
+        while True:
+            chunk = file_storage.stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > limit:
+                out.close()
+                os.remove(tmp_path)
+                raise RequestEntityTooLarge(f'{kind} files are limited to {limit} bytes')
+            digest.update(chunk)
+            out.write(chunk)
+
+    sha = digest.hexdigest()
+    filename = f"{sha[:2]}/{sha}{ext}"
+    acquire_blob(f"{kind}/{filename}", tmp_path, size)
+    return filename
+
+
+def _variant_name(filename, name, ext):
+    return f"{os.path.splitext(filename)[0]}_{name}{ext}"
+
+
+def variant_keys(key):
+    """Every key a variant of the stored file `key` may have been written to."""
+    kind, filename = key.split('/', 1)
+    return [f"{kind}/{_variant_name(filename, name, ext)}"
+            for name in VARIANTS.get(kind, {})
+            for ext in ('.webp', '.jpg')]
+
+
+def make_variants(kind, filename, sizes):
+    """Store resized, metadata-free copies next to the original.
+
+    Returns {variant name: filename}. WebP when Pillow was built with it,
+    JPEG otherwise. A deduplicated upload already has its variants, so
+    those are reused instead of being rendered again.
+    """
+    if Image is None:
+        log.warning('Pillow is not installed; skipping image variants')
+        return {}
+
+    storage = get_storage()
+    fmt, ext = ('WEBP', '.webp') if features.check('webp') else ('JPEG', '.jpg')
+    variants = {name: _variant_name(filename, name, ext) for name in sizes}
+    if all(storage.exists(f"{kind}/{v}") for v in variants.values()):
+        return variants
+
+    tmp_dir = current_app.config['UPLOAD_TMP_FOLDER']
+    os.makedirs(tmp_dir, exist_ok=True)
+
+    with storage.open(f"{kind}/{filename}") as src, Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        img = img.convert('RGBA' if fmt == 'WEBP' and 'A' in img.getbands() else 'RGB')
+
+        for name, (width, square) in sizes.items():
+            if square:
+                out = ImageOps.fit(img, (width, width), Image.LANCZOS)
+            else:
+                out = img.copy()
+                out.thumbnail((width, width * 4), Image.LANCZOS)
+            fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+            with os.fdopen(fd, 'wb') as dest:
+                # no exif/icc passed through, so camera metadata is dropped here
+                out.save(dest, fmt, quality=82, optimize=True)
+            storage.put_file(f"{kind}/{variants[name]}", tmp_path)
+
+    return variants
+
+
+def process_post_image(post_id, filename):
+    variants = make_variants('post_images', filename, VARIANTS['post_images'])
+    post = db.session.get(Post, post_id)
+    if post is not None and post.image == filename:
+        post.image_variants = variants
+        db.session.commit()
+
+
+def process_user_image(user_id, field, filename):
+    kind = {'profile_pic': 'profile_pics', 'cover_photo': 'cover_photos'}[field]
+    variants = make_variants(kind, filename, VARIANTS[kind])
+    user = db.session.get(User, user_id)
+    # the user may have uploaded again while we were busy
+    if user is not None and getattr(user, field) == filename:
+        setattr(user, f'{field}_variants', variants)
+        db.session.commit()
+
+
+def queue_post_image(post):
+    tasks.submit(process_post_image, post.id, post.image)
+
+
+def queue_user_image(user, field):
+    tasks.submit(process_user_image, user.id, field, getattr(user, field))
+
+
+def upload_url(kind, filename, variants=None, size=None):
+    """URL of an uploaded file, preferring the named variant once it exists."""
+    if variants and size in variants:
+        filename = variants[size]
+    return get_storage().url(f'{kind}/{filename}')
+
+
+def video_url(filename):
+    """URL of a post video; local files go through the ranged video route."""
+    storage = get_storage()
+    if storage.name == 'local':
+        return url_for('main.video', filename=filename)
+    return storage.url(f'post_videos/{filename}')
+
+
+def init_app(app):
+    app.add_template_global(upload_url)
+    app.add_template_global(video_url)
@@ -1,18 +1,82 @@
 from app import db, login_manager
+from flask import current_app, g, has_app_context
 from flask_login import UserMixin
 from datetime import datetime
+from sqlalchemy.dialects import postgresql, sqlite
+
+
+class SessionPrincipal(UserMixin):
+    """The logged-in user as most requests need it: the columns the page
+    chrome shows, cached by load_user.
+
+    Reading any other attribute or method loads the full User row once for
+    the request and delegates to it; assignments go through to that row, so
+    routes can treat current_user as a User.
+    """
+    # updated_at is what conditional.py puts in the viewer's ETag
+    FIELDS = ('id', 'username', 'fullname', 'profile_pic', 'profile_pic_variants', 'updated_at')
+
+    def __init__(self, data):
+        self.__dict__.update(data)
+        if isinstance(self.updated_at, str):
+            self.__dict__['updated_at'] = datetime.fromisoformat(self.updated_at)
+        self.__dict__['_user'] = None
+
+    @property
+    def user(self):
+        if self._user is None:
+            self.__dict__['_user'] = db.session.get(User, self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.user, name, value)
+        if name in self.FIELDS:
+            self.__dict__[name] = value
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    # The cache entry hangs off the user:<id> tag, so any committed change
+    # to the User row (edit_profile, new avatar variants) drops it
+    from app.cache import cache
+
+    user_id = int(user_id)
+    key = cache.key_for(f'principal:{user_id}', [f'user:{user_id}'])
+    data = cache.get(key) if cache.enabled else None
+    if data is None:
+        columns = [getattr(User, f) for f in SessionPrincipal.FIELDS]
+        row = db.session.execute(db.select(*columns).where(User.id == user_id)).first()
+        if row is None:
+            return None
+        data = row._asdict()
+        if cache.enabled:
+            cache.set(key, {**data, 'updated_at': data['updated_at'] and data['updated_at'].isoformat()},
+                      current_app.config['LOGIN_CACHE_TTL'])
+    return SessionPrincipal(data)
 
 followers = db.Table(
     'followers',
     db.Column('follower_id', db.Integer, db.ForeignKey('user.id')),
-    db.Column('followed_id', db.Integer, db.ForeignKey('user.id'))
+    db.Column('followed_id', db.Integer, db.ForeignKey('user.id')),
+    db.Index('ix_followers_pair', 'follower_id', 'followed_id', unique=True),
+    db.Index('ix_followers_followed_id', 'followed_id'),
 )
 
+
+def insert_ignore(table):
+    """INSERT that silently skips rows hitting a unique index."""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    return table.insert().prefix_with('IGNORE')
+
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     fullname = db.Column(db.String(100), nullable=True)
@@ -24,7 +88,12 @@ class User(db.Model, UserMixin):
     password = db.Column(db.String(200), nullable=False)
     profile_pic = db.Column(db.String(200), default='default.png')
     cover_photo = db.Column(db.String(200), default='default_cover.jpg')
+    profile_pic_variants = db.Column(db.JSON, nullable=True)
+    cover_photo_variants = db.Column(db.JSON, nullable=True)
     bio = db.Column(db.Text, default="")
+    follower_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    following_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     posts = db.relationship('Post', backref='author', lazy=True)
     likes = db.relationship('Like', backref='user', lazy=True)
     comments = db.relationship('Comment', backref='comment_author', lazy=True)
@@ -45,45 +114,217 @@ class User(db.Model, UserMixin):
     def follow(self, user):
         if not self.is_following(user):
             self.followed.append(user)
+            self._follow_memo()[user.id] = True
 
     def unfollow(self, user):
         if self.is_following(user):
             self.followed.remove(user)
+            self._follow_memo()[user.id] = False
 
     def is_following(self, user):
-        return self.followed.filter(followers.c.followed_id == user.id).count() > 0
+        return user.id in self.following_among([user.id])
+
+    def _follow_memo(self):
+        # {followed id: bool} for the current request/app context
+        if not has_app_context():
+            return {}
+        return g.setdefault('follow_memo', {}).setdefault(self.id, {})
+
+    def following_among(self, user_ids):
+        """Return the subset of user_ids this user follows.
+
+        One query for all ids not seen yet in this request; answers are
+        memoized on `g`, so templates can ask freely.
+        """
+        memo = self._follow_memo()
+        ids = {i for i in user_ids if i is not None}
+        missing = ids - memo.keys()
+        if missing:
+            found = set(db.session.execute(
+                db.select(followers.c.followed_id).where(
+                    followers.c.follower_id == self.id,
+                    followers.c.followed_id.in_(missing),
+                )
+            ).scalars())
+            memo.update((i, i in found) for i in missing)
+        return {i for i in ids if memo.get(i)}
+
+    def set_following(self, user, following):
+        """Make the follow edge exist (or not); returns the change in edge count."""
+        if following:
+            changed = db.session.execute(insert_ignore(followers).values(
+                follower_id=self.id, followed_id=user.id
+            )).rowcount
+        else:
+            changed = -db.session.execute(followers.delete().where(
+                followers.c.follower_id == self.id,
+                followers.c.followed_id == user.id,
+            )).rowcount
+        self._follow_memo()[user.id] = following
+        return changed
+
+    def toggle_follow(self, user):
+        """Flip the follow edge without reading it first.
+
+        Returns (following, delta) where delta is the change in edge count,
+        0 when a concurrent request already made the same change.
+        """
+        removed = self.set_following(user, False)
+        if removed:
+            return False, removed
+        return True, self.set_following(user, True)
 
 
 
 class Post(db.Model):
+    __table_args__ = (
+        db.Index('ix_post_category_date', 'category', 'date_posted'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
     image = db.Column(db.String(200), nullable=True)
+    image_variants = db.Column(db.JSON, nullable=True)
     video = db.Column(db.String(120))
     category = db.Column(db.String(100), nullable=True)
-    date_posted = db.Column(db.DateTime, default=datetime.utcnow)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date_posted = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    like_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    comment_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     likes = db.relationship('Like', backref='post', lazy=True)
     comments = db.relationship('Comment', backref='post', lazy=True, cascade="all, delete-orphan")
 
 
 class Like(db.Model):
+    __table_args__ = (
+        db.Index('ix_like_user_post', 'user_id', 'post_id', unique=True),
+        db.Index('ix_like_post_id', 'post_id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
     post_id = db.Column(db.Integer, db.ForeignKey('post.id'))
+    # NULL for likes made before this column existed
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    @staticmethod
+    def set(user_id, post_id, liked):
+        """Make the like exist (or not); returns the change in row count."""
+        table = Like.__table__
+        if liked:
+            return db.session.execute(insert_ignore(table).values(
+                user_id=user_id, post_id=post_id
+            )).rowcount
+        return -db.session.execute(table.delete().where(
+            table.c.user_id == user_id, table.c.post_id == post_id
+        )).rowcount
+
+    @staticmethod
+    def toggle(user_id, post_id):
+        """Like or unlike in at most two statements and no SELECT.
+
+        Returns (liked, delta) like User.toggle_follow.
+        """
+        removed = Like.set(user_id, post_id, False)
+        if removed:
+            return False, removed
+        return True, Like.set(user_id, post_id, True)
 
 
 class Comment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     content = db.Column(db.Text, nullable=False)
-    date_posted = db.Column(db.DateTime, default=datetime.utcnow)
+    date_posted = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False)
-    parent_id = db.Column(db.Integer, db.ForeignKey("comment.id"), nullable=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), nullable=False, index=True)
+    parent_id = db.Column(db.Integer, db.ForeignKey("comment.id"), nullable=True, index=True)
     replies = db.relationship(
         "Comment",
         backref=db.backref("parent", remote_side=[id]),
         lazy="dynamic",
         cascade="all, delete-orphan"
     )
+
+
+class TimelineEntry(db.Model):
+    """One post in one user's materialized "following" feed.
+
+    date_posted is copied from the post so a page of the feed is a single
+    range scan over (user_id, date_posted, post_id).
+    """
+    __table_args__ = (
+        db.Index('ix_timeline_feed', 'user_id', 'date_posted', 'post_id'),
+        db.Index('ix_timeline_post_id', 'post_id'),
+        db.Index('ix_timeline_user_author', 'user_id', 'author_id'),
+    )
+
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    post_id = db.Column(db.Integer, db.ForeignKey('post.id'), primary_key=True)
+    author_id = db.Column(db.Integer, nullable=False)
+    date_posted = db.Column(db.DateTime, nullable=False)
+
+class TrendingScore(db.Model):
+    """One post's place in a trending list, written by `flask trending-refresh`.
+
+    scope is '' for the site-wide list or a category name, so a page of a
+    list is a range scan over (scope, rank). There is no foreign key: a
+    deleted post drops out of the join until the next refresh.
+    """
+    scope = db.Column(db.String(100), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    post_id = db.Column(db.Integer, nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+
+class FollowSuggestion(db.Model):
+    """One "who to follow" entry, written by `flask suggestions-refresh`.
+
+    A user's list is a range scan over the (user_id, rank) primary key.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    suggested_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    score = db.Column(db.Float, nullable=False)
+
+
+class GraphChange(db.Model):
+    """Users whose follow edges changed since their suggestions were computed."""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+
+
+class CategoryStat(db.Model):
+    """Post count and newest post per category, kept by app.categories."""
+    category = db.Column(db.String(100), primary_key=True)
+    post_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_posted_at = db.Column(db.DateTime, nullable=True)
+
+
+class Blob(db.Model):
+    """One stored upload, keyed by '<kind>/<sha256[:2]>/<sha256><ext>'.
+
+    refcount is the number of rows pointing at the file; released_at is
+    when it last dropped, so the GC sweep can leave a grace period.
+    """
+    key = db.Column(db.String(200), primary_key=True)
+    size = db.Column(db.BigInteger, nullable=False)
+    refcount = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    released_at = db.Column(db.DateTime, nullable=True, index=True)
+
+
+class UploadSession(db.Model):
+    """A chunked upload in progress, see app.uploads.
+
+    The bytes received so far live in a .part file under
+    UPLOAD_TMP_FOLDER; its length is the resume offset. sha256 is set once
+    the upload is finalized.
+    """
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)
+    ext = db.Column(db.String(10), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -0,0 +1,161 @@
+import json
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = logging.getLogger('coolstack.perf')
+
+_NUMBER = re.compile(r"\b\d+\b")
+_STRING = re.compile(r"'(?:''|[^'])*'")
+_IN_LIST = re.compile(r"\bIN \((?:[^()]|\([^()]*\))*\)", re.I)
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(statement):
+    """Statement text with literals and IN-lists folded, so queries that
+    differ only by the ids they look up compare equal."""
+    sql = _STRING.sub('?', statement)
+    sql = _NUMBER.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+        self.params = defaultdict(set)
+
+    def record(self, statement, parameters, elapsed):
+        fp = fingerprint(statement)
+        self.queries += 1
+        self.db_time += elapsed
+        self.statements[fp] += 1
+        self.params[fp].add(repr(parameters))
+
+    def suspects(self, threshold):
+        """Fingerprints run `threshold`+ times with different parameters: N+1."""
+        return [{'sql': fp, 'count': n, 'distinct_params': len(self.params[fp])}
+                for fp, n in self.statements.most_common()
+                if n >= threshold and len(self.params[fp]) > 1]
+
+
+class Aggregate:
+    """Per-endpoint totals since the worker started (one copy per process)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = defaultdict(lambda: {
+                'requests': 0, 'queries': 0, 'max_queries': 0,
+                'db_ms': 0.0, 'total_ms': 0.0, 'nplus1': Counter(),
+            })
+
+    def add(self, endpoint, queries, db_ms, total_ms, suspects):
+        with self._lock:
+            row = self.endpoints[endpoint]
+            row['requests'] += 1
+            row['queries'] += queries
+            row['max_queries'] = max(row['max_queries'], queries)
+            row['db_ms'] += db_ms
+            row['total_ms'] += total_ms
+            for s in suspects:
+                row['nplus1'][s['sql']] += 1
+
+    def snapshot(self):
+        with self._lock:
+            out = {}
+            for endpoint, row in self.endpoints.items():
+                n = row['requests']
+                out[endpoint] = {
+                    'requests': n,
+                    'avg_queries': round(row['queries'] / n, 2),
+                    'max_queries': row['max_queries'],
+                    'avg_db_ms': round(row['db_ms'] / n, 2),
+                    'avg_total_ms': round(row['total_ms'] / n, 2),
+                    'nplus1': [{'sql': sql, 'requests': hits}
+                               for sql, hits in row['nplus1'].most_common(5)],
+                }
+            return out
+
+
+stats = Aggregate()
+
+
+def _current():
+    return g.get('perf') if has_app_context() else None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current() is not None:
+        conn.info.setdefault('perf_started', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current()
+    started = conn.info.get('perf_started')
+    if profile is not None and started:
+        profile.record(statement, parameters, time.perf_counter() - started.pop())
+
+
+def _start():
+    rate = current_app.config['PERF_SAMPLE_RATE']
+    forced = current_app.config.get('DEBUG_ENDPOINTS') and request.headers.get('X-Profile') == '1'
+    if forced or (rate and random.random() < rate):
+        g.perf = RequestProfile()
+
+
+def _finish(response):
+    profile = g.pop('perf', None)
+    if profile is None:
+        return response
+
+    total_ms = (time.perf_counter() - profile.started) * 1000
+    db_ms = profile.db_time * 1000
+    suspects = profile.suspects(current_app.config['PERF_NPLUS1_THRESHOLD'])
+    endpoint = request.endpoint or 'unmatched'
+
+    response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{profile.queries} queries"')
+    response.headers.add('Server-Timing', f'app;dur={total_ms:.1f}')
+
+    log.info(json.dumps({
+        'event': 'request_profile',
+        'method': request.method,
+        'path': request.path,
+        'endpoint': endpoint,
+        'status': response.status_code,
+        'queries': profile.queries,
+        'db_ms': round(db_ms, 2),
+        'total_ms': round(total_ms, 2),
+        'nplus1': suspects,
+    }))
+    if suspects:
+        log.warning('possible N+1 on %s: %s', endpoint,
+                    '; '.join(f"{s['count']}x {s['sql'][:120]}" for s in suspects))
+
+    stats.add(endpoint, profile.queries, db_ms, total_ms, suspects)
+    return response
+
+
+def init_app(app):
+    """Sample PERF_SAMPLE_RATE of requests (0 = off, 1 = all).
+
+    With DEBUG_ENDPOINTS on, an `X-Profile: 1` request header forces a sample.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    app.before_request(_start)
+    app.after_request(_finish)
@@ -0,0 +1,163 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+from flask import current_app
+
+log = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    def __init__(self, channels):
+        self.channels = frozenset(channels)
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._put_lock = threading.Lock()
+
+    def put(self, data):
+        # one publisher at a time, so two racing over the last free slot
+        # cannot both drop a delta and then find the queue full again
+        with self._put_lock:
+            while True:
+                try:
+                    self.queue.put_nowait(data)
+                    return
+                except queue.Full:
+                    # a stalled client loses the oldest delta rather than blocking publishers
+                    try:
+                        self.queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def get(self, timeout):
+        return self.queue.get(timeout=timeout)
+
+
+class LocalBroker:
+    """In-process pub/sub: only streams served by this worker see a message."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels = {}  # channel -> set of Subscription
+
+    def subscribe(self, channels):
+        sub = Subscription(channels)
+        with self._lock:
+            for channel in sub.channels:
+                self._channels.setdefault(channel, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            for channel in sub.channels:
+                subs = self._channels.get(channel)
+                if subs is not None:
+                    subs.discard(sub)
+                    if not subs:
+                        del self._channels[channel]
+
+    def publish(self, channel, data):
+        with self._lock:
+            subs = list(self._channels.get(channel, ()))
+        for sub in subs:
+            try:
+                sub.put(data)
+            except Exception:
+                # the other subscribers still get the delta
+                log.exception('could not queue live update on %s', channel)
+
+    def __len__(self):
+        with self._lock:
+            return len(set().union(*self._channels.values())) if self._channels else 0
+
+
+class RedisBroker(LocalBroker):
+    """Publishes through Redis so every worker (and host) sees every delta.
+
+    Each process runs one listener thread that fans Redis messages out to
+    its local subscribers; it starts on first subscribe, i.e. after fork.
+    """
+
+    def __init__(self, url, prefix='coolstack:live:'):
+        super().__init__()
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._listener = None
+
+    def publish(self, channel, data):
+        self.redis.publish(self.prefix + channel, data)
+
+    def subscribe(self, channels):
+        if self._listener is None or not self._listener.is_alive():
+            with self._lock:
+                if self._listener is None or not self._listener.is_alive():
+                    self._listener = threading.Thread(target=self._listen, daemon=True)
+                    self._listener.start()
+        return super().subscribe(channels)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                for item in pubsub.listen():
+                    channel = item['channel'].decode()[len(self.prefix):]
+                    super().publish(channel, item['data'].decode())
+            except Exception:
+                log.exception('live update listener lost Redis; reconnecting')
+                time.sleep(1)
+
+
+def broker():
+    return current_app.extensions['realtime']
+
+
+def publish(channel, **delta):
+    """Send a delta to everyone watching `channel` ('post:<id>', 'user:<id>').
+
+    Call after the commit, so nobody is told about a change that rolled back.
+    """
+    try:
+        broker().publish(channel, json.dumps(delta, separators=(',', ':')))
+    except Exception:
+        # live updates are best effort; the write itself already succeeded
+        log.exception('could not publish live update on %s', channel)
+
+
+def event_stream(sub, lifetime):
+    """Server-Sent Events for one subscription until `lifetime` runs out.
+
+    Streams end on their own so a worker's slots are recycled; EventSource
+    reconnects after the `retry` delay and resubscribes.
+    """
+    yield 'retry: 3000\n\n'
+    deadline = time.monotonic() + lifetime
+    while (remaining := deadline - time.monotonic()) > 0:
+        try:
+            data = sub.get(timeout=min(HEARTBEAT_SECONDS, remaining))
+        except queue.Empty:
+            yield ': ping\n\n'
+            continue
+        yield f'data: {data}\n\n'
+
+
+def init_app(app):
+    """REALTIME_BROKER is 'local' (one process) or 'redis' (any number).
+
+    Every open stream occupies a worker thread (or greenlet), so each
+    process serves at most REALTIME_MAX_STREAMS of them; the default is half
+    the worker's request concurrency, which means none at all with sync
+    workers. Run gevent workers to hold many streams.
+    """
+    if app.config['REALTIME_BROKER'] == 'redis':
+        app.extensions['realtime'] = RedisBroker(app.config['REALTIME_REDIS_URL'])
+    else:
+        app.extensions['realtime'] = LocalBroker()
+    app.extensions['realtime_slots'] = threading.BoundedSemaphore(
+        max(app.config['REALTIME_MAX_STREAMS'], 1)
+    )
@@ -0,0 +1,70 @@
+import random
+import re
+import time
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+
+_READ_ONLY_TEXT = re.compile(r'\s*(SELECT|WITH)\b', re.I)
+
+
+def _is_write(clause):
+    if isinstance(clause, UpdateBase):
+        return True
+    if isinstance(clause, TextClause):
+        return not _READ_ONLY_TEXT.match(clause.text)
+    return getattr(clause, '_for_update_arg', None) is not None
+
+
+class RoutingSession(Session):
+    """Sends a request's reads to the replica picked by @replica_reads.
+
+    Flushes, INSERT/UPDATE/DELETE, SELECT ... FOR UPDATE and anything run
+    outside a request (CLI, background tasks) use the primary. Once a
+    request has written, its remaining reads go to the primary too, so it
+    sees its own uncommitted rows.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or _is_write(clause):
+                g.db_wrote = True
+            elif g.get('replica_bind') and not g.get('db_wrote'):
+                return self._db.engines[g.replica_bind]
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+
+def replica_reads(view):
+    """Let a GET view read from a replica, unless the visitor wrote recently."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        replicas = current_app.extensions.get('replicas')
+        if (replicas and request.method in ('GET', 'HEAD')
+                and session.get('_rw_until', 0) < time.time()):
+            g.replica_bind = random.choice(replicas)
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def _stick_to_primary(response):
+    # replicas lag; after a write, keep this visitor on the primary for a while
+    if g.get('db_wrote'):
+        session['_rw_until'] = time.time() + current_app.config['REPLICA_STICKY_SECONDS']
+    return response
+
+
+def init_app(app):
+    """Route @replica_reads views to the DATABASE_REPLICA_URLS binds.
+
+    A visitor who writes (like, comment, post, follow...) is pinned to the
+    primary for REPLICA_STICKY_SECONDS via their session cookie, so they
+    read their own writes. With no replicas configured nothing changes.
+    """
+    replicas = [key for key in app.config['SQLALCHEMY_BINDS'] if key.startswith('replica')]
+    if not replicas:
+        return
+    app.extensions['replicas'] = replicas
+    app.after_request(_stick_to_primary)
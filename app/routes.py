@@ -1,20 +1,31 @@
-from flask import Blueprint, render_template, redirect, url_for, flash, request, current_app, jsonify
+import os
+
+from flask import Blueprint, Response, render_template, redirect, url_for, flash, request, current_app, jsonify, abort
 from app import db
-from uuid import uuid4
-from app.models import User, Post, Like, Comment
-from app.forms import SignupForm, LoginForm, PostForm, EditProfileForm, CommentForm
+from app.models import User, Post, Comment, CategoryStat
+from app.feed import feed_page, InvalidCursor, FEED_PAGE_SIZE
+from app import actions, categories, profiling, realtime, suggestions, timeline, trending, uploads
+from app.streaming import send_ranged
+from app.comments import load_comment_page
+from app.cache import cache, cached_page
+from app.conditional import conditional, latest
+from app.replicas import replica_reads
+from app.media import save_upload, queue_post_image, queue_user_image
+from app.storage import get_storage, release_upload
+from app.search import search_backend, search_terms, SEARCH_PAGE_SIZE, USER_RESULTS_LIMIT
+from app.forms import CATEGORIES, SignupForm, LoginForm, PostForm, EditProfileForm, CommentForm
 from flask_login import login_user, logout_user, current_user, login_required
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
-import os
+from werkzeug.utils import safe_join
+from sqlalchemy import func, select
+from sqlalchemy.orm import joinedload
 
 bp = Blueprint('main', __name__)
 
-UPLOAD_FOLDER = 'app/static/uploads'
-
 
 # ---------------- LANDING PAGE ----------------
 @bp.route('/')
+@cached_page()
 def landing():
     login_form = LoginForm()
     signup_form = SignupForm()
@@ -28,10 +39,46 @@ def landing():
 
 # ---------------- HOME ----------------
 @bp.route('/home')
+@replica_reads
 @login_required
 def home():
-    posts = Post.query.order_by(Post.date_posted.desc()).all()
-    return render_template('home.html', posts=posts)
+    mode = request.args.get('feed')
+    page = _home_page(mode)
+    return render_template('home.html', posts=page.posts, next_cursor=page.next_cursor, mode=mode,
+                           following_ids=_following_ids(p.user_id for p in page.posts),
+                           suggested=suggestions.suggestions_for(current_user.id))
+
+
+def _following_ids(user_ids):
+    """Which of these accounts the viewer follows, for the follow buttons."""
+    if not current_user.is_authenticated:
+        return set()
+    return current_user.following_among(user_ids)
+
+
+def _home_page(mode, cursor=None):
+    # ?feed=following reads the materialized timeline; default is everyone
+    if mode == 'following':
+        return timeline.timeline_page(current_user, cursor=cursor)
+    return feed_page(cursor=cursor)
+
+
+# ----- HOME FEED NEXT PAGE (AJAX infinite scroll) -----
+@bp.route('/home/feed')
+@replica_reads
+@login_required
+def home_feed():
+    mode = request.args.get('feed')
+    try:
+        page = _home_page(mode, cursor=request.args.get('cursor'))
+    except InvalidCursor:
+        abort(400)
+
+    html = render_template('partials/_feed_posts.html', posts=page.posts,
+                           following_ids=_following_ids(p.user_id for p in page.posts))
+    next_url = (url_for('main.home_feed', cursor=page.next_cursor, feed=mode)
+                if page.next_cursor else None)
+    return jsonify({"html": html, "next_url": next_url})
 
 
 # ---------------- SIGNUP ----------------
@@ -52,6 +99,8 @@ def signup():
                 password=generate_password_hash(form.password.data)
             )
             db.session.add(new_user)
+            db.session.flush()
+            search_backend().index_user(new_user)
             db.session.commit()
             login_user(new_user)
             return jsonify({
@@ -75,6 +124,8 @@ def signup():
             password=generate_password_hash(form.password.data)
         )
         db.session.add(new_user)
+        db.session.flush()
+        search_backend().index_user(new_user)
         db.session.commit()
         login_user(new_user)
         flash(f"Welcome, {new_user.username}!", 'success')
@@ -131,20 +182,6 @@ def logout():
     return redirect(url_for('main.landing'))
 
 
-def save_upload(file_storage, folder):
-    """Save file with a unique name and return filename."""
-    if not file_storage or file_storage.filename == "":
-        return None
-
-    ext = os.path.splitext(file_storage.filename)[1].lower()
-    filename = secure_filename(f"{uuid4().hex}{ext}")
-    os.makedirs(folder, exist_ok=True)
-
-    path = os.path.join(folder, filename)
-    file_storage.save(path)
-    return filename
-
-
 
 # ---------------- CREATE POST ----------------
 @bp.route('/create_post', methods=['GET', 'POST'])
@@ -165,23 +202,28 @@ def create_post():
                 user_id=current_user.id
             )
 
-            base_upload = os.path.join(current_app.root_path, "static", "uploads")
-            images_folder = os.path.join(base_upload, "post_images")
-            videos_folder = os.path.join(base_upload, "post_videos")
-
-            # Save image
-            new_image = save_upload(form.image.data, images_folder)
+            # Save image (a form file, or a finished chunked upload)
+            new_image = (save_upload(form.image.data, "post_images")
+                         or uploads.claim(form.image_upload.data, "post_images", current_user))
             if new_image:
                 post.image = new_image
 
             # Save video
-            new_video = save_upload(form.video.data, videos_folder)
+            new_video = (save_upload(form.video.data, "post_videos")
+                         or uploads.claim(form.video_upload.data, "post_videos", current_user))
             if new_video:
                 post.video = new_video
 
             db.session.add(post)
+            db.session.flush()
+            search_backend().index_post(post)
             db.session.commit()
 
+            # resizing and timeline fan-out happen off the request thread
+            if post.image:
+                queue_post_image(post)
+            timeline.queue_fan_out(post)
+
             if request.headers.get("X-Requested-With") == "XMLHttpRequest":
                 return jsonify({"success": True, "message": "Post created successfully!"})
 
@@ -193,36 +235,101 @@ def create_post():
     return render_template("create_post.html", form=form, modal_only=False)
 
 
+# ---------------- CATEGORIES ----------------
+def _category_state(category_name):
+    """Validator for a category page: its counter row and the first page of posts."""
+    shown = (select(Post.updated_at.label('post_updated'), User.updated_at.label('author_updated'))
+             .join(User, User.id == Post.user_id)
+             .where(Post.category == category_name)
+             .order_by(Post.date_posted.desc(), Post.id.desc())
+             .limit(FEED_PAGE_SIZE)
+             .subquery())
+    row = db.session.query(func.max(shown.c.post_updated), func.max(shown.c.author_updated)).one()
+    stat = db.session.get(CategoryStat, category_name)
+    count = stat.post_count if stat else 0
+    return (count, *row), latest(*row)
 
 
 @bp.route('/category/<string:category_name>')
+@replica_reads
+@conditional(_category_state)
+@cached_page(tags=lambda category_name: [f'category:{category_name}'])
 def category_posts(category_name):
-    posts = Post.query.filter_by(category=category_name).order_by(Post.date_posted.desc()).all()
-    return render_template('category_posts.html', posts=posts, category_name=category_name)
-
+    page = categories.category_page(category_name)
+    stat = db.session.get(CategoryStat, category_name)
+    return render_template('category_posts.html', posts=page.posts, next_cursor=page.next_cursor,
+                           category_name=category_name, post_count=stat.post_count if stat else 0,
+                           following_ids=_following_ids(p.user_id for p in page.posts))
+
+
+@bp.route('/category/<string:category_name>/feed')
+@replica_reads
+def category_feed(category_name):
+    try:
+        page = categories.category_page(category_name, cursor=request.args.get('cursor'))
+    except InvalidCursor:
+        abort(400)
+
+    html = render_template('partials/_feed_posts.html', posts=page.posts,
+                           following_ids=_following_ids(p.user_id for p in page.posts))
+    next_url = (url_for('main.category_feed', category_name=category_name, cursor=page.next_cursor)
+                if page.next_cursor else None)
+    return jsonify({"html": html, "next_url": next_url})
+
+
+# ---------------- TRENDING ----------------
+@bp.route('/trending')
+@replica_reads
+@cached_page(tags=lambda: ['trending'])
+def trending_posts():
+    """Site-wide trending list, or one category's with ?category=."""
+    category = request.args.get('category') or None
+    page = trending.trending_page(category)
+    return render_template('trending.html', posts=page.posts, category=category,
+                           categories=CATEGORIES,
+                           next_cursor=page.next_cursor,
+                           following_ids=_following_ids(p.user_id for p in page.posts))
+
+
+@bp.route('/trending/feed')
+@replica_reads
+def trending_feed():
+    category = request.args.get('category') or None
+    page = trending.trending_page(category, after=request.args.get('after', 0, type=int))
+    html = render_template('partials/_feed_posts.html', posts=page.posts,
+                           following_ids=_following_ids(p.user_id for p in page.posts))
+    next_url = (url_for('main.trending_feed', category=category, after=page.next_cursor)
+                if page.next_cursor else None)
+    return jsonify({"html": html, "next_url": next_url})
 
-@bp.route('/category/<string:category_name>')
-def category_page(category_name):
-    posts = Post.query.filter_by(category=category_name).all()
-    return render_template('category.html', posts=posts, category_name=category_name)
 
+# ---------------- VIEW POST + ADD COMMENT ----------------
+def _post_state(post_id):
+    """Validator for a post page: the post, its author and its commenters."""
+    commenters = (select(func.max(User.updated_at))
+                  .join(Comment, Comment.user_id == User.id)
+                  .where(Comment.post_id == post_id)
+                  .scalar_subquery())
+    row = (db.session.query(Post.updated_at, Post.like_count, Post.comment_count,
+                            User.updated_at, commenters)
+           .join(User, User.id == Post.user_id)
+           .filter(Post.id == post_id)
+           .first())
+    if row is None:
+        return None
+    return row, latest(row[0], row[3], row[4])
 
 
-# ---------------- VIEW POST + ADD COMMENT ----------------
 @bp.route('/post/<int:post_id>', methods=['GET', 'POST'])
+@replica_reads
+@conditional(_post_state)
+@cached_page(tags=lambda post_id: [f'post:{post_id}', f'comments:{post_id}'])
 def view_post(post_id):
     post = Post.query.get_or_404(post_id)
-    comments = Comment.query.filter_by(post_id=post.id).order_by(Comment.date_posted.desc()).all()
     form = CommentForm()
 
     if form.validate_on_submit() and current_user.is_authenticated:
-        new_comment = Comment(
-            content=form.comment.data.strip(),
-            user_id=current_user.id,
-            post_id=post.id
-        )
-        db.session.add(new_comment)
-        db.session.commit()
+        actions.add_comment(current_user, post, form.comment.data.strip())
         flash('Comment added!', 'success')
         return redirect(url_for('main.view_post', post_id=post.id))
 
@@ -230,15 +337,34 @@ def view_post(post_id):
         flash('Please log in to comment.', 'warning')
         return redirect(url_for('main.login'))
 
-    return render_template('view_post.html', post=post, comments=comments, form=form)
+    page = load_comment_page(post.id)
+    return render_template('view_post.html', post=post, threads=page.threads,
+                           next_cursor=page.next_cursor, form=form)
 
 # ----- FETCH COMMENTS (AJAX) -----
+# ?cursor=... returns just the next page of threads; layout=page renders
+# them with the view_post markup instead of the modal's.
 @bp.route('/comments/<int:post_id>')
+@replica_reads
+@conditional(_post_state)
+@cached_page(tags=lambda post_id: [f'post:{post_id}', f'comments:{post_id}'])
 def fetch_comments(post_id):
     post = Post.query.get_or_404(post_id)
-    comments = Comment.query.filter_by(post_id=post.id).order_by(Comment.date_posted.desc()).all()
+    cursor = request.args.get('cursor')
+    try:
+        page = load_comment_page(post.id, cursor=cursor)
+    except InvalidCursor:
+        abort(400)
     form = CommentForm()
-    return render_template('partials/_comments.html', post=post, comments=comments, form=form)
+
+    if not cursor:
+        template = 'partials/_comments.html'
+    elif request.args.get('layout') == 'page':
+        template = 'partials/_post_comment_threads.html'
+    else:
+        template = 'partials/_comment_threads.html'
+    return render_template(template, post=post, threads=page.threads,
+                           next_cursor=page.next_cursor, form=form)
 
    
 # ----- ADD COMMENT (for AJAX) ------
@@ -249,16 +375,21 @@ def add_comment(post_id):
     form = CommentForm()
     parent_id = request.form.get("parent_id")
 
+    xhr = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
     if form.validate_on_submit():
-        comment = Comment(
-            content=form.comment.data.strip(),
-            user_id=current_user.id,
-            post_id=post.id,
-            parent_id=int(parent_id) if parent_id else None
-        )
-        db.session.add(comment)
-        db.session.commit()
+        comment, delta = actions.add_comment(current_user, post, form.comment.data.strip(),
+                                             int(parent_id) if parent_id else None)
+        if xhr:
+            # just the new thread, in the markup of the page that asked for it
+            template = ('partials/_post_comment_threads.html' if request.args.get('layout') == 'page'
+                        else 'partials/_comment_threads.html')
+            html = render_template(template, post=post, threads=[comment], next_cursor=None,
+                                   form=CommentForm())
+            return jsonify(success=True, html=html, **delta)
         flash("Comment posted successfully.", "success")
+    elif xhr:
+        return jsonify(success=False, message="Unable to post comment."), 400
     else:
         flash("Unable to post comment.", "danger")
 
@@ -275,34 +406,40 @@ def delete_comment(comment_id):
         return redirect(url_for('main.view_post', post_id=comment.post_id))
 
     post_id = comment.post_id
-
-    db.session.delete(comment)
-    db.session.commit()
+    actions.delete_comment(comment)
 
     flash("Reply deleted successfully.", "success")
     return redirect(url_for('main.view_post', post_id=post_id))
 
 
 # ---------------- VIEW PROFILE ----------------
+def _profile_tags(username):
+    user_id = User.query.with_entities(User.id).filter_by(username=username).scalar()
+    return [f'user:{user_id}']
+
+
+def _profile_state(username):
+    row = (db.session.query(User.updated_at, User.follower_count, User.following_count,
+                            func.count(Post.id), func.max(Post.updated_at))
+           .outerjoin(Post, Post.user_id == User.id)
+           .filter(User.username == username)
+           .group_by(User.id)
+           .first())
+    if row is None:
+        return None
+    return row, latest(row[0], row[4])
+
+
 @bp.route('/profile/<username>')
+@replica_reads
+@conditional(_profile_state)
+@cached_page(tags=_profile_tags)
 def view_profile(username):
     user = User.query.filter_by(username=username).first_or_404()
     posts = Post.query.filter_by(user_id=user.id).order_by(Post.date_posted.desc()).all()
-    return render_template('view_profile.html', user=user, posts=posts)
-
-
-def save_upload(file_storage, folder):
-    """Save file with a unique name and return filename."""
-    if not file_storage or file_storage.filename == "":
-        return None
-
-    ext = os.path.splitext(file_storage.filename)[1].lower()  # like ".jpg"
-    filename = secure_filename(f"{uuid4().hex}{ext}")
-    os.makedirs(folder, exist_ok=True)
+    return render_template('view_profile.html', user=user, posts=posts,
+                           following_ids=_following_ids([user.id]))
 
-    path = os.path.join(folder, filename)
-    file_storage.save(path)
-    return filename
 
 # ---------------- EDIT PROFILE ----------------
 @bp.route('/edit_profile', methods=['GET', 'POST'])
@@ -319,19 +456,34 @@ def edit_profile():
             current_user.dob = form.dob.data
             current_user.gender = form.gender.data
             current_user.phone_number = form.phone_number.data
+            search_backend().index_user(current_user)
 
             # uploads
-            profile_folder = os.path.join(current_app.root_path, 'static/uploads/profile_pics')
-            new_profile = save_upload(form.profile_pic.data, profile_folder)
+            old_profile, old_cover = current_user.profile_pic, current_user.cover_photo
+            new_profile = (save_upload(form.profile_pic.data, 'profile_pics')
+                           or uploads.claim(form.profile_pic_upload.data, 'profile_pics', current_user))
             if new_profile:
                 current_user.profile_pic = new_profile
+                current_user.profile_pic_variants = None
 
-            cover_folder = os.path.join(current_app.root_path, 'static/uploads/cover_photos')
-            new_cover = save_upload(form.cover_photo.data, cover_folder)
+            new_cover = (save_upload(form.cover_photo.data, 'cover_photos')
+                         or uploads.claim(form.cover_photo_upload.data, 'cover_photos', current_user))
             if new_cover:
                 current_user.cover_photo = new_cover
+                current_user.cover_photo_variants = None
 
+            db.session.flush()
+            if new_profile:
+                release_upload('profile_pics', old_profile)
+            if new_cover:
+                release_upload('cover_photos', old_cover)
             db.session.commit()
+
+            if new_profile:
+                queue_user_image(current_user, 'profile_pic')
+            if new_cover:
+                queue_user_image(current_user, 'cover_photo')
+
             flash('Profile updated successfully!', 'success')
             return redirect(url_for('main.profile'))
 
@@ -360,22 +512,13 @@ def profile():
 @login_required
 def like_post(post_id):
     post = Post.query.get_or_404(post_id)
-    like = Like.query.filter_by(user_id=current_user.id, post_id=post.id).first()
 
-    if like:
-        db.session.delete(like)
-        db.session.commit()
-        liked = False
-    else:
-        new_like = Like(user_id=current_user.id, post_id=post.id)
-        db.session.add(new_like)
-        db.session.commit()
-        liked = True
+    liked, like_count = actions.like(current_user, post)
 
     # Return JSON for AJAX update
     return jsonify({
         "liked": liked,
-        "like_count": len(post.likes)
+        "like_count": like_count
     })
 
 
@@ -390,17 +533,15 @@ def delete_post(post_id):
         flash("You are not authorized to delete this post.", "danger")
         return redirect(url_for('main.home'))
 
-    if post.image:
-        image_path = os.path.join(current_app.root_path, 'static/uploads', post.image)
-        if os.path.exists(image_path):
-            os.remove(image_path)
-
-    if post.video:
-        video_path = os.path.join(current_app.root_path, 'static/uploads', post.video)
-        if os.path.exists(video_path):
-            os.remove(video_path)
-
+    search_backend().remove_post(post.id)
+    timeline.retract_post(post.id)
     db.session.delete(post)
+    db.session.flush()
+
+    # files are shared between identical uploads, so drop a reference
+    # rather than deleting; `flask storage-gc` reclaims the space
+    release_upload('post_images', post.image)
+    release_upload('post_videos', post.video)
     db.session.commit()
 
     flash("Post deleted successfully.", "info")
@@ -410,34 +551,37 @@ def delete_post(post_id):
 
 # ---------------- SEARCH ----------------
 @bp.route('/search')
+@replica_reads
 def search():
     q = request.args.get('q', '').strip()
     if not q:
         return redirect(url_for('main.home'))
 
-    # Find users matching search term
-    users = User.query.filter(
-        (User.username.ilike(f"%{q}%")) | (User.fullname.ilike(f"%{q}%"))
-    ).all()
-
-    # Find posts matching title/content
-    posts = Post.query.filter(
-        (Post.title.ilike(f"%{q}%")) | (Post.content.ilike(f"%{q}%"))
-    ).order_by(Post.date_posted.desc()).all()
+    page = max(request.args.get('page', 1, type=int), 1)
+    terms = search_terms(q)
+    users, posts, total = [], [], 0
 
-    # Include posts by matching users
-    user_posts = []
-    for user in users:
-        user_posts.extend(user.posts)
+    if terms:
+        engine = search_backend()
+        user_ids = engine.search_users(terms, USER_RESULTS_LIMIT)
+        post_ids, total = engine.search_posts(terms, page, SEARCH_PAGE_SIZE)
 
-    # Merge and remove duplicates
-    all_posts = list({p.id: p for p in (posts + user_posts)}.values())
+        # fetch by id in one query each, then restore the engine's ranking
+        found_users = {u.id: u for u in User.query.filter(User.id.in_(user_ids))}
+        users = [found_users[i] for i in user_ids if i in found_users]
+        found_posts = {p.id: p for p in Post.query.options(joinedload(Post.author))
+                       .filter(Post.id.in_(post_ids))}
+        posts = [found_posts[i] for i in post_ids if i in found_posts]
 
     return render_template(
         'search_results.html',
         users=users,
-        posts=all_posts,
-        query=q
+        posts=posts,
+        following_ids=_following_ids([u.id for u in users] + [p.user_id for p in posts]),
+        query=q,
+        page=page,
+        has_next=page * SEARCH_PAGE_SIZE < total,
+        total=total
     )
 
 
@@ -448,18 +592,61 @@ def follow(user_id):
     if current_user == user:
         return jsonify(status='error', message="You cannot follow yourself"), 400
 
-    if current_user.is_following(user):
-        current_user.unfollow(user)
-        db.session.commit()
-        return jsonify(status='unfollowed')
-    else:
-        current_user.follow(user)
-        db.session.commit()
-        return jsonify(status='followed')
+    following = actions.follow(current_user, user)
+    return jsonify(status='followed' if following else 'unfollowed')
+
+
+# ---------------- LIVE UPDATES (SSE) ----------------
+MAX_STREAM_CHANNELS = 200
+
+
+def _id_list(name):
+    return sorted({int(v) for v in request.args.get(name, '').split(',') if v.isdigit()})
+
+
+@bp.route('/stream')
+def stream():
+    """?posts=1,2&users=3 streams like/comment/follower deltas for those ids."""
+    channels = ([f'post:{i}' for i in _id_list('posts')]
+                + [f'user:{i}' for i in _id_list('users')])[:MAX_STREAM_CHANNELS]
+    if not channels or not current_app.config['REALTIME_MAX_STREAMS']:
+        return '', 204  # tells EventSource not to reconnect
+
+    slots = current_app.extensions['realtime_slots']
+    if not slots.acquire(blocking=False):
+        return '', 503, {'Retry-After': '30'}
+    broker = realtime.broker()
+    sub = broker.subscribe(channels)
+
+    def release():
+        broker.unsubscribe(sub)
+        slots.release()
+
+    response = Response(realtime.event_stream(sub, current_app.config['REALTIME_STREAM_SECONDS']),
+                        mimetype='text/event-stream')
+    response.call_on_close(release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass events straight through
+    return response
+
+
+# ---------------- VIDEO ----------------
+@bp.route('/video/<path:filename>')
+def video(filename):
+    """Post videos with Range support, so players can seek without a full download."""
+    storage = get_storage()
+    key = f'post_videos/{filename}'
+    if storage.name != 'local':
+        return redirect(storage.url(key))
+    path = safe_join(storage.root, key)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    return send_ranged(path, key)
 
 
 # ---------------- ABOUT ----------------
 @bp.route('/about')
+@cached_page()
 def about():
     return render_template('about.html')
 
@@ -468,3 +655,19 @@ def about():
 def settings():
     return render_template('settings.html')
 
+
+# --------Debug stats (DEBUG_ENDPOINTS=1)-----------
+@bp.route('/_debug/cache')
+def debug_cache():
+    if not current_app.config.get('DEBUG_ENDPOINTS'):
+        abort(404)
+    return jsonify(cache.stats())
+
+
+@bp.route('/_debug/perf')
+def debug_perf():
+    if not current_app.config.get('DEBUG_ENDPOINTS'):
+        abort(404)
+    if request.args.get('reset') == '1':
+        profiling.stats.reset()
+    return jsonify(profiling.stats.snapshot())
@@ -0,0 +1,223 @@
+import logging
+import re
+
+from flask import current_app
+from sqlalchemy import inspect, or_, text
+
+from app import db
+from app.models import User, Post
+
+SEARCH_PAGE_SIZE = 20
+USER_RESULTS_LIMIT = 20
+MAX_TERMS = 8
+
+log = logging.getLogger(__name__)
+
+
+def search_terms(q):
+    """Split free text into word tokens; everything else is dropped so user
+    input never reaches the query syntax of the underlying engine."""
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """Interface every search engine implements.
+
+    Index maintenance methods run inside the caller's transaction so the
+    index commits or rolls back together with the row it describes.
+    """
+
+    def available(self):
+        """Whether the index this backend reads exists in the database.
+
+        The index schema is created by a migration (`flask db upgrade`),
+        never at startup.
+        """
+        return True
+
+    def rebuild(self):
+        pass
+
+    def index_post(self, post):
+        pass
+
+    def remove_post(self, post_id):
+        pass
+
+    def index_user(self, user):
+        pass
+
+    def search_posts(self, terms, page, per_page):
+        """Return (post_ids best first, total matches)."""
+        raise NotImplementedError
+
+    def search_users(self, terms, limit):
+        """Return matching user ids, best first."""
+        raise NotImplementedError
+
+
+class LikeBackend(SearchBackend):
+    """Portable fallback: substring matching, no index support."""
+
+    def search_posts(self, terms, page, per_page):
+        query = Post.query.join(User, Post.user_id == User.id)
+        for term in terms:
+            pattern = f"%{term}%"
+            query = query.filter(or_(
+                Post.title.ilike(pattern), Post.content.ilike(pattern),
+                User.username.ilike(pattern), User.fullname.ilike(pattern),
+            ))
+        total = query.count()
+        rows = (query.with_entities(Post.id)
+                .order_by(Post.date_posted.desc())
+                .offset((page - 1) * per_page).limit(per_page))
+        return [r.id for r in rows], total
+
+    def search_users(self, terms, limit):
+        query = User.query
+        for term in terms:
+            pattern = f"%{term}%"
+            query = query.filter(or_(User.username.ilike(pattern), User.fullname.ilike(pattern)))
+        return [r.id for r in query.with_entities(User.id).limit(limit)]
+
+
+class SQLiteFTSBackend(SearchBackend):
+    """FTS5 virtual tables keyed by rowid = post.id / user.id."""
+
+    def available(self):
+        return db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'post_fts'"
+        )).first() is not None
+
+    def rebuild(self):
+        db.session.execute(text("DELETE FROM post_fts"))
+        db.session.execute(text("DELETE FROM user_fts"))
+        db.session.execute(text(
+            "INSERT INTO post_fts (rowid, title, content, author) "
+            "SELECT p.id, p.title, p.content, u.username || ' ' || coalesce(u.fullname, '') "
+            "FROM post p JOIN \"user\" u ON u.id = p.user_id"
+        ))
+        db.session.execute(text(
+            "INSERT INTO user_fts (rowid, username, fullname) "
+            "SELECT id, username, coalesce(fullname, '') FROM \"user\""
+        ))
+        db.session.commit()
+
+    def index_post(self, post):
+        author = post.author
+        self.remove_post(post.id)
+        db.session.execute(text(
+            "INSERT INTO post_fts (rowid, title, content, author) VALUES (:id, :title, :content, :author)"
+        ), {"id": post.id, "title": post.title, "content": post.content,
+            "author": f"{author.username} {author.fullname or ''}"})
+
+    def remove_post(self, post_id):
+        db.session.execute(text("DELETE FROM post_fts WHERE rowid = :id"), {"id": post_id})
+
+    def index_user(self, user):
+        db.session.execute(text("DELETE FROM user_fts WHERE rowid = :id"), {"id": user.id})
+        db.session.execute(text(
+            "INSERT INTO user_fts (rowid, username, fullname) VALUES (:id, :username, :fullname)"
+        ), {"id": user.id, "username": user.username, "fullname": user.fullname or ""})
+        # the author column lets "posts by this person" match without a join
+        db.session.execute(text(
+            "UPDATE post_fts SET author = :author "
+            "WHERE rowid IN (SELECT id FROM post WHERE user_id = :id)"
+        ), {"id": user.id, "author": f"{user.username} {user.fullname or ''}"})
+
+    @staticmethod
+    def _match(terms):
+        # every term must match, each as a prefix
+        return " ".join(f'"{t}"*' for t in terms)
+
+    def search_posts(self, terms, page, per_page):
+        match = self._match(terms)
+        total = db.session.execute(text(
+            "SELECT count(*) FROM post_fts WHERE post_fts MATCH :q"
+        ), {"q": match}).scalar()
+        rows = db.session.execute(text(
+            "SELECT rowid FROM post_fts WHERE post_fts MATCH :q "
+            "ORDER BY bm25(post_fts, 10.0, 1.0, 4.0) LIMIT :limit OFFSET :offset"
+        ), {"q": match, "limit": per_page, "offset": (page - 1) * per_page})
+        return [r[0] for r in rows], total
+
+    def search_users(self, terms, limit):
+        rows = db.session.execute(text(
+            "SELECT rowid FROM user_fts WHERE user_fts MATCH :q ORDER BY rank LIMIT :limit"
+        ), {"q": self._match(terms), "limit": limit})
+        return [r[0] for r in rows]
+
+
+# must stay the expression of the ix_user_search index (migration a7d3e5f19c62)
+USER_TSVECTOR = "to_tsvector('simple', coalesce(username, '') || ' ' || coalesce(fullname, ''))"
+
+
+class PostgresFTSBackend(SearchBackend):
+    """tsvector + GIN. post.search_vector is a generated column, so Postgres
+    keeps it current on insert/update/delete and the index hooks are no-ops."""
+
+    def available(self):
+        return any(c['name'] == 'search_vector' for c in inspect(db.engine).get_columns('post'))
+
+    @staticmethod
+    def _tsquery(terms):
+        return " & ".join(f"{t}:*" for t in terms)
+
+    _HITS = (
+        "WITH hits AS ("
+        " SELECT p.id, p.date_posted, ts_rank(p.search_vector, to_tsquery('english', :q)) AS rank"
+        " FROM post p WHERE p.search_vector @@ to_tsquery('english', :q)"
+        " UNION ALL"
+        " SELECT p.id, p.date_posted, 0.05 FROM post p"
+        f' JOIN (SELECT id FROM "user" WHERE {USER_TSVECTOR} @@ to_tsquery(\'simple\', :q)) u'
+        " ON u.id = p.user_id"
+        ") "
+    )
+
+    def search_posts(self, terms, page, per_page):
+        q = self._tsquery(terms)
+        total = db.session.execute(text(
+            self._HITS + "SELECT count(DISTINCT id) FROM hits"
+        ), {"q": q}).scalar()
+        rows = db.session.execute(text(
+            self._HITS + "SELECT id FROM hits GROUP BY id, date_posted "
+            "ORDER BY sum(rank) DESC, date_posted DESC LIMIT :limit OFFSET :offset"
+        ), {"q": q, "limit": per_page, "offset": (page - 1) * per_page})
+        return [r[0] for r in rows], total
+
+    def search_users(self, terms, limit):
+        rows = db.session.execute(text(
+            f'SELECT id FROM "user" WHERE {USER_TSVECTOR} @@ to_tsquery(\'simple\', :q) '
+            f"ORDER BY ts_rank({USER_TSVECTOR}, to_tsquery('simple', :q)) DESC LIMIT :limit"
+        ), {"q": self._tsquery(terms), "limit": limit})
+        return [r[0] for r in rows]
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTSBackend,
+    'postgresql': PostgresFTSBackend,
+}
+
+
+def search_backend():
+    return current_app.extensions['search']
+
+
+def init_app(app):
+    """Pick the engine for the configured database, if its index has been migrated.
+
+    SEARCH_BACKEND=like forces the portable fallback. Nothing is created
+    here; a database that has not run the search migration yet also falls
+    back until `flask db upgrade` has been run.
+    """
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        if app.config.get('SEARCH_BACKEND') == 'like':
+            backend = LikeBackend()
+        else:
+            backend = BACKENDS.get(dialect, LikeBackend)()
+            if not backend.available():
+                log.warning('%s search index missing; run `flask db upgrade`. '
+                            'Using substring search until then.', dialect)
+                backend = LikeBackend()
+    app.extensions['search'] = backend
@@ -155,68 +155,104 @@ document.addEventListener("DOMContentLoaded", () => {
   })();
 
   /* ------------------ FOLLOW / UNFOLLOW BUTTONS ------------------ */
-  (function followButtons() {
-    const buttons = safeQueryAll(".follow-btn");
-    if (!buttons.length) return;
-    buttons.forEach(button => {
-      button.addEventListener("click", async () => {
-        const userId = button.dataset.userId;
-        if (!userId) return console.warn("follow-btn missing data-user-id");
-        try {
-          const csrf = getMetaCSRF();
-          const res = await fetch(`/main/follow/${userId}`, {
-            method: "POST",
-            headers: {
-              "Content-Type": "application/json",
-              ...(csrf ? { "X-CSRFToken": csrf } : {})
-            }
-          });
-          if (!res.ok) throw new Error("Network error");
-          const json = await res.json();
-          if (json.status === "followed") {
-            button.textContent = "Unfollow";
-            button.classList.remove("btn-primary");
-            button.classList.add("btn-danger");
-          } else if (json.status === "unfollowed") {
-            button.textContent = "Follow";
-            button.classList.remove("btn-danger");
-            button.classList.add("btn-primary");
-          } else {
-            alert(json.message || "Error following/unfollowing. Please refresh and try again.");
-          }
-        } catch (err) {
-          console.error("Follow error:", err);
-          alert("Error following/unfollowing. Please refresh and try again.");
+  // Delegated so buttons on infinite-scroll pages work without re-binding
+  document.addEventListener("click", async (e) => {
+    const button = e.target.closest(".follow-btn");
+    if (!button) return;
+    const userId = button.dataset.userId;
+    if (!userId) return console.warn("follow-btn missing data-user-id");
+    try {
+      const csrf = getMetaCSRF();
+      const res = await fetch(`/main/follow/${userId}`, {
+        method: "POST",
+        headers: {
+          "Content-Type": "application/json",
+          ...(csrf ? { "X-CSRFToken": csrf } : {})
         }
       });
-    });
+      if (!res.ok) throw new Error("Network error");
+      const json = await res.json();
+      if (json.status === "followed") {
+        button.textContent = "Unfollow";
+        button.classList.remove("btn-primary");
+        button.classList.add("btn-danger");
+      } else if (json.status === "unfollowed") {
+        button.textContent = "Follow";
+        button.classList.remove("btn-danger");
+        button.classList.add("btn-primary");
+      } else {
+        alert(json.message || "Error following/unfollowing. Please refresh and try again.");
+      }
+    } catch (err) {
+      console.error("Follow error:", err);
+      alert("Error following/unfollowing. Please refresh and try again.");
+    }
+  });
+
+  /* ------------------ HOME FEED: INFINITE SCROLL ------------------ */
+  (function infiniteFeed() {
+    const list = document.getElementById("feedPosts");
+    const sentinel = document.getElementById("feedSentinel");
+    if (!list || !sentinel || !("IntersectionObserver" in window)) return;
+
+    let loading = false;
+    const observer = new IntersectionObserver(async (entries) => {
+      if (!entries.some(en => en.isIntersecting) || loading) return;
+      const nextUrl = sentinel.dataset.nextUrl;
+      if (!nextUrl) return observer.disconnect();
+
+      loading = true;
+      try {
+        const res = await fetch(nextUrl, {
+          headers: { "X-Requested-With": "XMLHttpRequest" },
+          credentials: "same-origin"
+        });
+        if (!res.ok) throw new Error("Failed to load more posts");
+        const json = await res.json();
+        list.insertAdjacentHTML("beforeend", json.html);
+        document.dispatchEvent(new CustomEvent("content:appended", { detail: { root: list } }));
+
+        if (json.next_url) {
+          sentinel.dataset.nextUrl = json.next_url;
+        } else {
+          observer.disconnect();
+          sentinel.remove();
+        }
+      } catch (err) {
+        console.error("Feed error:", err);
+      } finally {
+        loading = false;
+      }
+    }, { rootMargin: "600px 0px" });
+
+    observer.observe(sentinel);
   })();
 
   /* ------------------ COMMENT MODAL + LOAD ------------------ */
   (function commentModal() {
     const commentModal = document.getElementById("commentModal");
     const commentSection = document.getElementById("commentSection");
-    const commentBtns = safeQueryAll(".comment-btn");
-    if (!commentModal || !commentSection || !commentBtns.length) return;
+    if (!commentModal || !commentSection) return;
 
-    commentBtns.forEach(btn => {
-      btn.addEventListener("click", async (e) => {
-        e.preventDefault();
-        const postId = btn.dataset.postId;
-        if (!postId) return console.warn("comment-btn missing data-post-id");
-        try {
-          const res = await fetch(`/main/comments/${postId}`, {
-            headers: { "X-Requested-With": "XMLHttpRequest" }
-          });
-          if (!res.ok) throw new Error("Failed to load comments");
-          const html = await res.text();
-          commentSection.innerHTML = html;
-          commentModal.style.display = "block";
-        } catch (err) {
-          console.error("Load comments error:", err);
-          alert("Error loading comments. Please try again.");
-        }
-      });
+    // delegated, so cards appended by infinite scroll work too
+    document.addEventListener("click", async (e) => {
+      const btn = e.target.closest(".comment-btn");
+      if (!btn) return;
+      e.preventDefault();
+      const postId = btn.dataset.postId;
+      if (!postId) return console.warn("comment-btn missing data-post-id");
+      try {
+        const res = await fetch(`/main/comments/${postId}`, {
+          headers: { "X-Requested-With": "XMLHttpRequest" }
+        });
+        if (!res.ok) throw new Error("Failed to load comments");
+        const html = await res.text();
+        commentSection.innerHTML = html;
+        commentModal.style.display = "block";
+      } catch (err) {
+        console.error("Load comments error:", err);
+        alert("Error loading comments. Please try again.");
+      }
     });
 
     const closeBtn = commentModal.querySelector(".close");
@@ -224,19 +260,57 @@ document.addEventListener("DOMContentLoaded", () => {
     window.addEventListener("click", (e) => { if (e.target === commentModal) commentModal.style.display = "none"; });
   })();
 
+  /* ------------------ COMMENTS: LOAD MORE THREADS ------------------ */
+  document.addEventListener("click", async (e) => {
+    const btn = e.target.closest(".load-more-comments");
+    if (!btn || btn.disabled) return;
+    e.preventDefault();
+    btn.disabled = true;
+    try {
+      const res = await fetch(btn.dataset.url, {
+        headers: { "X-Requested-With": "XMLHttpRequest" }
+      });
+      if (!res.ok) throw new Error("Failed to load comments");
+      const parent = btn.parentElement;
+      btn.insertAdjacentHTML("afterend", await res.text());
+      btn.remove();
+      document.dispatchEvent(new CustomEvent("content:appended", { detail: { root: parent } }));
+    } catch (err) {
+      console.error("Load more comments error:", err);
+      btn.disabled = false;
+    }
+  });
+
   /* ------------------ COMMENT SUBMISSION (AJAX) ------------------ */
+  // The server answers with JSON holding just the new thread's markup.
+  const COMMENT_SELECTOR = ".comment, .cs-comment, .reply, .cs-reply";
+  const findComment = (root, id) =>
+    Array.from(root.querySelectorAll(`[data-comment-id="${id}"]`)).find(el => el.matches(COMMENT_SELECTOR));
+
   (function commentSubmit() {
     document.addEventListener("submit", async (e) => {
       if (e.target && e.target.id === "commentForm") {
         e.preventDefault();
         const form = e.target;
-        const data = new FormData(form);
+        const list = form.closest(".comments, .cs-comments")?.querySelector(".comment-threads");
+        const url = new URL(form.action, window.location.href);
+        if (form.closest(".cs-comments")) url.searchParams.set("layout", "page");
         try {
-          const res = await fetch(form.action, { method: "POST", body: data });
-          if (!res.ok) throw new Error("Network error submitting comment");
-          const html = await res.text();
-          const commentSection = document.getElementById("commentSection");
-          if (commentSection) commentSection.innerHTML = html;
+          const res = await fetch(url, {
+            method: "POST",
+            body: new FormData(form),
+            headers: { "X-Requested-With": "XMLHttpRequest" }
+          });
+          const json = await res.json();
+          if (!json.success) return showFlash(json.message || "Unable to post comment.", "error");
+
+          if (list) {
+            findComment(list, json.comment.id)?.remove();  // the live stream may have beaten us
+            list.insertAdjacentHTML("afterbegin", json.html);
+            document.dispatchEvent(new CustomEvent("content:appended", { detail: { root: list } }));
+          }
+          patchLive(json);
+          form.reset();
         } catch (err) {
           console.error("Comment submit error:", err);
           alert("Error sending comment. Please refresh and try again.");
@@ -245,6 +319,112 @@ document.addEventListener("DOMContentLoaded", () => {
     });
   })();
 
+  /* ------------------ LIVE UPDATES (SSE) ------------------ */
+  // Elements carrying data-live-post / data-live-user + data-live-field are
+  // kept current from /main/stream, which sends JSON deltas such as
+  // {"post": 3, "like_count": 12} or {"user": 5, "follower_count": 40}.
+  function patchLive(delta) {
+    const [attr, id] = delta.post ? ["data-live-post", delta.post] : ["data-live-user", delta.user];
+    Object.entries(delta).forEach(([field, value]) => {
+      if (typeof value !== "number") return;
+      document.querySelectorAll(`[${attr}="${id}"][data-live-field="${field}"]`)
+        .forEach(el => { el.textContent = value; });
+    });
+  }
+
+  // Others' comments arrive as data, not markup; top-level ones are shown
+  // straight away (replies only bump the count until the next load).
+  function buildComment(list, c) {
+    const pageLayout = !!list.closest(".cs-comments");
+    const el = (tag, cls, text) => {
+      const node = document.createElement(tag);
+      if (cls) node.className = cls;
+      if (text !== undefined) node.textContent = text;
+      return node;
+    };
+    const avatar = el("img", "comment-avatar");
+    avatar.src = c.avatar;
+    const date = el("span", pageLayout ? "cs-date full" : "full date");
+    date.dataset.time = c.date;
+
+    const root = el("div", pageLayout ? "cs-comment" : "comment");
+    root.dataset.commentId = c.id;
+    if (pageLayout) {
+      const head = el("div", "cs-comment__head");
+      const user = el("div", "cs-user");
+      const link = el("a", "cs-username", `@${c.username}`);
+      link.href = `/main/profile/${encodeURIComponent(c.username)}`;
+      user.append(avatar, el("strong", "cs-author", c.fullname), link);
+      head.append(user, date);
+      root.append(head, el("p", "cs-text", c.content));
+    } else {
+      const body = el("div", "comment-body");
+      const top = el("div", "comment-top");
+      top.append(el("strong", null, c.fullname), date);
+      body.append(top, el("p", null, c.content));
+      root.append(avatar, body);
+    }
+    return root;
+  }
+
+  function applyDelta(delta) {
+    patchLive(delta);
+    document.querySelectorAll(`.comment-threads[data-post-id="${delta.post}"]`).forEach(list => {
+      if (delta.removed_comment) findComment(list, delta.removed_comment)?.remove();
+      if (delta.comment && !delta.comment.parent_id && !findComment(list, delta.comment.id)) {
+        list.prepend(buildComment(list, delta.comment));
+        document.dispatchEvent(new CustomEvent("content:appended", { detail: { root: list } }));
+      }
+    });
+  }
+
+  (function liveUpdates() {
+    if (!("EventSource" in window)) return;
+    let source = null;
+    let current = "";
+    let backoff = 5000;
+
+    const ids = (attr) => [...new Set(safeQueryAll(`[${attr}]`).map(el => el.getAttribute(attr)))];
+    const wanted = () => {
+      const params = new URLSearchParams();
+      const posts = ids("data-live-post");
+      const users = ids("data-live-user");
+      if (posts.length) params.set("posts", posts.join(","));
+      if (users.length) params.set("users", users.join(","));
+      return params.toString();
+    };
+
+    const connect = () => {
+      const query = wanted();
+      if (source && query === current) return;
+      source?.close();
+      source = null;
+      current = query;
+      if (!query) return;
+
+      source = new EventSource(`/main/stream?${query}`);
+      source.onopen = () => { backoff = 5000; };
+      source.onmessage = (e) => {
+        try { applyDelta(JSON.parse(e.data)); } catch (err) { console.error("Live update error:", err); }
+      };
+      source.onerror = () => {
+        // a 503 (server full) closes the stream for good; retry with backoff
+        if (source.readyState !== EventSource.CLOSED) return;
+        source = null;
+        setTimeout(connect, backoff);
+        backoff = Math.min(backoff * 2, 120000);
+      };
+    };
+
+    let pending = null;
+    document.addEventListener("content:appended", () => {
+      clearTimeout(pending);
+      pending = setTimeout(connect, 1000);  // new posts scrolled in: resubscribe
+    });
+    window.addEventListener("pagehide", () => source?.close());
+    connect();
+  })();
+
   /* ------------------ LOGIN / SIGNUP MODALS + AJAX FORMS ------------------ */
   (function authModals() {
     const loginModal = document.getElementById("loginModal");
@@ -355,6 +535,112 @@ document.addEventListener("DOMContentLoaded", () => {
     attachAjaxForm(signupModal);
   })();
 
+  /* ------------------ CHUNKED UPLOADS ------------------ */
+  // Files over this size skip the form post (the server caps request bodies)
+  // and go to /api/v1/uploads in pieces; the form then carries the upload id
+  // in its hidden <field>_upload input instead of the file.
+  const CHUNKED_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+  const UPLOAD_API = "/api/v1/uploads";
+  const MAX_CHUNK_RETRIES = 5;
+
+  async function uploadRequest(url, options = {}) {
+    const csrf = getMetaCSRF();
+    const res = await fetch(url, {
+      credentials: "same-origin",
+      ...options,
+      headers: { ...(options.headers || {}), ...(csrf ? { "X-CSRFToken": csrf } : {}) }
+    });
+    const json = res.status === 204 ? {} : await res.json().catch(() => ({}));
+    return { res, json };
+  }
+
+  async function chunkedUpload(file, kind) {
+    // remembered per file, so a reload after a dropped connection resumes
+    const memo = `upload:${kind}:${file.name}:${file.size}:${file.lastModified}`;
+    let state = null;
+    const savedId = localStorage.getItem(memo);
+    if (savedId) {
+      const { res, json } = await uploadRequest(`${UPLOAD_API}/${savedId}`);
+      if (res.ok) state = json.data;
+    }
+    if (!state) {
+      const { res, json } = await uploadRequest(UPLOAD_API, {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ kind, filename: file.name, size: file.size })
+      });
+      if (!res.ok) throw new Error(json.error || "Upload refused");
+      state = json.data;
+      localStorage.setItem(memo, state.id);
+    }
+
+    let failures = 0;
+    while (state.offset < state.size) {
+      const end = Math.min(state.offset + state.chunk_size, state.size);
+      let res = null, json = {};
+      try {
+        ({ res, json } = await uploadRequest(`${UPLOAD_API}/${state.id}`, {
+          method: "PUT",
+          headers: { "Content-Range": `bytes ${state.offset}-${end - 1}/${state.size}` },
+          body: file.slice(state.offset, end)
+        }));
+      } catch (err) {
+        // connection dropped; ask the server how much arrived and go on from there
+      }
+      if (res?.ok) {
+        state = json.data;
+        failures = 0;
+        continue;
+      }
+      if (res && res.status !== 409 && res.status < 500) throw new Error(json.error || "Upload failed");
+      if (++failures > MAX_CHUNK_RETRIES) throw new Error("Upload keeps failing, please try again later");
+      await sleep(500 * 2 ** failures);
+      try {
+        const status = await uploadRequest(`${UPLOAD_API}/${state.id}`);
+        if (status.res.ok) state = status.json.data;
+      } catch (err) {
+        // still offline; the next attempt waits longer
+      }
+    }
+
+    if (!state.complete) {
+      const { res, json } = await uploadRequest(`${UPLOAD_API}/${state.id}/finalize`, { method: "POST" });
+      if (!res.ok) throw new Error(json.error || "Upload failed");
+    }
+    localStorage.removeItem(memo);
+    return state.id;
+  }
+
+  // Sends the form's big files through the upload API; returns the FormData to post.
+  async function prepareChunkedUploads(form) {
+    const inputs = Array.from(form.querySelectorAll('input[type="file"][data-upload-kind]'));
+    for (const input of inputs) {
+      const file = input.files?.[0];
+      const hidden = form.querySelector(`input[name="${input.name}_upload"]`);
+      if (!file || !hidden || file.size <= CHUNKED_UPLOAD_THRESHOLD) continue;
+      hidden.value = await chunkedUpload(file, input.dataset.uploadKind);
+      input.value = "";
+    }
+    return new FormData(form);
+  }
+
+  const hasLargeFile = (form) => Array.from(form.querySelectorAll('input[type="file"][data-upload-kind]'))
+    .some(input => input.files?.[0]?.size > CHUNKED_UPLOAD_THRESHOLD);
+
+  // plain (non-AJAX) forms such as edit profile
+  document.addEventListener("submit", async (e) => {
+    const form = e.target.closest("form[data-chunked-uploads]");
+    if (!form || e.defaultPrevented || !hasLargeFile(form)) return;
+    e.preventDefault();
+    try {
+      await prepareChunkedUploads(form);
+      form.submit();
+    } catch (err) {
+      console.error("Upload error:", err);
+      showFlash(err.message, "error");
+    }
+  });
+
   /* ------------------ CREATE POST MODAL (LOAD FORM + SUBMIT) ------------------ */
   (function createPostModal() {
     const postModal = document.getElementById("createPostModal");
@@ -389,9 +675,8 @@ document.addEventListener("DOMContentLoaded", () => {
             form.addEventListener("submit", async (ev) => {
                 ev.preventDefault();
 
-                const fd = new FormData(form);
-
                 try {
+                    const fd = await prepareChunkedUploads(form);
                     const r = await fetch(CREATE_POST_URL, {
                       method: "POST",
                       body: fd,
@@ -412,7 +697,7 @@ document.addEventListener("DOMContentLoaded", () => {
                     }
                 } catch (err) {
                     console.error("Submit error:", err);
-                    alert("Error submitting post. Try again.");
+                    alert(err.message || "Error submitting post. Try again.");
                 }
             });
           }
@@ -536,26 +821,34 @@ document.addEventListener("DOMContentLoaded", () => {
     };
     update();
     setInterval(update, 60000);
+    document.addEventListener("content:appended", update);
   })();
 
   /* ------------------ VIDEO CONTAINERS ------------------ */
   (function initVideoOverlays() {
-    // supports both: .video_container (home) and .video-container (view_post)
-    document.querySelectorAll(".video_container, .video-container").forEach((container) => {
-      const video = container.querySelector("video");
-      const overlay = container.querySelector(".play-overlay");
-      if (!video || !overlay) return;
-
-      overlay.addEventListener("click", () => {
-        // optional: if already playing, pause
-        if (video.paused) video.play();
-        else video.pause();
+    const bind = (root) => {
+      // supports both: .video_container (home) and .video-container (view_post)
+      root.querySelectorAll(".video_container, .video-container").forEach((container) => {
+        if (container.dataset.bound) return;
+        const video = container.querySelector("video");
+        const overlay = container.querySelector(".play-overlay");
+        if (!video || !overlay) return;
+        container.dataset.bound = "1";
+
+        overlay.addEventListener("click", () => {
+          // optional: if already playing, pause
+          if (video.paused) video.play();
+          else video.pause();
+        });
+
+        video.addEventListener("play", () => container.classList.add("playing"));
+        video.addEventListener("pause", () => container.classList.remove("playing"));
+        video.addEventListener("ended", () => container.classList.remove("playing"));
       });
+    };
 
-      video.addEventListener("play", () => container.classList.add("playing"));
-      video.addEventListener("pause", () => container.classList.remove("playing"));
-      video.addEventListener("ended", () => container.classList.remove("playing"));
-    });
+    bind(document);
+    document.addEventListener("content:appended", (e) => bind(e.detail?.root || document));
   })();
 
   
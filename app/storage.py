@@ -0,0 +1,264 @@
+import io
+import logging
+import mimetypes
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from flask import current_app, url_for
+from sqlalchemy import event, func
+
+from app import db
+from app.models import User, Post, Blob, insert_ignore
+
+log = logging.getLogger(__name__)
+
+# files that ship with the app and are shared by every account
+DEFAULT_FILES = {'default.png', 'default.jpg', 'default_cover.jpg'}
+
+
+class LocalStorage:
+    """Keys are paths under UPLOAD_FOLDER, served by the static route."""
+
+    name = 'local'
+
+    def __init__(self, root):
+        self.root = root
+
+    def local_path(self, key):
+        return os.path.join(self.root, key)
+
+    def put_file(self, key, src_path):
+        dest = self.local_path(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        shutil.move(src_path, dest)
+
+    def exists(self, key):
+        return os.path.exists(self.local_path(key))
+
+    def open(self, key):
+        return open(self.local_path(key), 'rb')
+
+    def delete(self, key):
+        try:
+            os.remove(self.local_path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key):
+        return url_for('static', filename=f'uploads/{key}')
+
+
+class S3Storage:
+    """Any S3-compatible store (AWS, MinIO, a localstack container, ...)."""
+
+    name = 's3'
+
+    def __init__(self, bucket, endpoint_url=None, public_url=None, region=None):
+        import boto3
+
+        self.bucket = bucket
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+
+    def local_path(self, key):
+        return None
+
+    def put_file(self, key, src_path):
+        content_type = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+        # keys are content hashes, so objects never change once written
+        self.client.upload_file(src_path, self.bucket, key, ExtraArgs={
+            'ContentType': content_type,
+            'CacheControl': 'public, max-age=31536000, immutable',
+        })
+        os.remove(src_path)
+
+    def exists(self, key):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError:
+            return False
+        return True
+
+    def open(self, key):
+        body = self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+        return io.BytesIO(body.read())
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def url(self, key):
+        if self.public_url:
+            return f'{self.public_url}/{key}'
+        return self.client.generate_presigned_url(
+            'get_object', Params={'Bucket': self.bucket, 'Key': key}, ExpiresIn=3600
+        )
+
+
+def get_storage():
+    return current_app.extensions['storage']
+
+
+def acquire_blob(key, tmp_path, size, keep_on_rollback=False):
+    """Take a reference on `key`, storing tmp_path under it if it is new.
+
+    Runs in the caller's transaction so the reference is only kept if the
+    row pointing at the file commits. Storage is only written once that
+    transaction commits, so a rollback never leaves a file behind that no
+    Blob row accounts for. Without a commit tmp_path is deleted, or left
+    for the caller with keep_on_rollback.
+    """
+    added = False
+    bumped = Blob.query.filter_by(key=key).update(
+        {Blob.refcount: Blob.refcount + 1, Blob.released_at: None},
+        synchronize_session=False
+    )
+    if not bumped:
+        added = db.session.execute(insert_ignore(Blob.__table__).values(
+            key=key, size=size, refcount=1, created_at=datetime.utcnow()
+        )).rowcount
+        if not added:  # lost a race with an identical upload
+            Blob.query.filter_by(key=key).update(
+                {Blob.refcount: Blob.refcount + 1, Blob.released_at: None},
+                synchronize_session=False
+            )
+
+    storage = get_storage()
+
+    def store():
+        # an existing blob normally has its file already; a put that failed
+        # after some earlier commit is repaired here
+        if added or not storage.exists(key):
+            storage.put_file(key, tmp_path)
+        else:
+            _remove_quietly(tmp_path)
+
+    on_commit(store, None if keep_on_rollback else lambda: _remove_quietly(tmp_path))
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+# ---------------- FILES FOLLOW THE TRANSACTION ----------------
+def on_commit(action, on_rollback=None):
+    """Run `action` once the current transaction commits.
+
+    `on_rollback` runs instead if it ends any other way (rollback, or the
+    session being closed at the end of a failed request).
+    """
+    db.session.info.setdefault('storage_actions', []).append((action, on_rollback))
+
+
+def _run_commit_actions(session):
+    for action, _ in session.info.pop('storage_actions', ()):
+        try:
+            action()
+        except Exception:  # the rows are committed; report rather than fail the request
+            log.exception('storage action after commit failed')
+
+
+def _run_rollback_actions(session, transaction):
+    if transaction.parent is not None:  # a savepoint, not the real transaction
+        return
+    for _, on_rollback in session.info.pop('storage_actions', ()):
+        if on_rollback is not None:
+            on_rollback()
+
+
+LEGACY_COLUMNS = {
+    'post_images': Post.image,
+    'post_videos': Post.video,
+    'profile_pics': User.profile_pic,
+    'cover_photos': User.cover_photo,
+}
+
+
+def release_upload(kind, filename):
+    """Drop one reference to an uploaded file.
+
+    Content-addressed files are only decremented here; `flask storage-gc`
+    deletes them once nothing has used them for a grace period. Files from
+    before content addressing have no Blob row and are removed once the
+    transaction commits, if no row still points at them. Call after
+    flushing the change that stopped referencing the file.
+    """
+    if not filename or filename in DEFAULT_FILES:
+        return
+    key = f'{kind}/{filename}'
+
+    released = Blob.query.filter(Blob.key == key, Blob.refcount > 0).update(
+        {Blob.refcount: Blob.refcount - 1, Blob.released_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    if released or db.session.get(Blob, key) is not None:
+        return
+
+    column = LEGACY_COLUMNS[kind]
+    still_used = db.session.query(func.count()).filter(column == filename).scalar()
+    if not still_used:
+        # after commit, so a rolled-back delete never loses the file
+        on_commit(lambda: _delete_with_variants(key))
+
+
+def _delete_with_variants(key):
+    from app.media import variant_keys
+
+    storage = get_storage()
+    for k in [key] + variant_keys(key):
+        storage.delete(k)
+
+
+def collect_garbage(grace=timedelta(hours=1)):
+    """Delete unreferenced blobs (and their variants). Returns how many went.
+
+    Each row is removed with a guarded DELETE and its files are deleted
+    before that transaction commits. The DELETE holds the row (the whole
+    database on SQLite), so an upload of the same content waits, then finds
+    no row and stores the file afresh after the sweep has removed it. If a
+    file cannot be deleted the row is kept for the next sweep.
+    """
+    cutoff = datetime.utcnow() - grace
+    keys = [k for (k,) in db.session.query(Blob.key)
+            .filter(Blob.refcount <= 0, Blob.released_at < cutoff)]
+    db.session.commit()
+
+    removed = 0
+    for key in keys:
+        gone = Blob.query.filter(Blob.key == key, Blob.refcount <= 0).delete(
+            synchronize_session=False
+        )
+        if not gone:  # acquired again since the scan
+            db.session.rollback()
+            continue
+        try:
+            _delete_with_variants(key)
+        except Exception:
+            db.session.rollback()
+            log.exception('could not delete %s; keeping it for the next sweep', key)
+            continue
+        db.session.commit()
+        removed += 1
+    return removed
+
+
+def init_app(app):
+    kind = app.config.get('STORAGE_BACKEND', 'local')
+    if kind == 's3':
+        backend = S3Storage(
+            app.config['STORAGE_S3_BUCKET'],
+            endpoint_url=app.config.get('STORAGE_S3_ENDPOINT'),
+            public_url=app.config.get('STORAGE_S3_PUBLIC_URL'),
+            region=app.config.get('STORAGE_S3_REGION'),
+        )
+    else:
+        backend = LocalStorage(app.config['UPLOAD_FOLDER'])
+    app.extensions['storage'] = backend
+    if not event.contains(db.session, 'after_commit', _run_commit_actions):
+        event.listen(db.session, 'after_commit', _run_commit_actions)
+        event.listen(db.session, 'after_transaction_end', _run_rollback_actions)
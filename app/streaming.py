@@ -0,0 +1,167 @@
+"""Serve large local files (post videos) with byte ranges.
+
+send_ranged answers If-None-Match / If-Modified-Since with 304, honours
+If-Range, and returns 206 for one range or multipart/byteranges for
+several. A whole file or a single range goes out as a seeked file object
+through wsgi.file_wrapper, so gunicorn can hand it to sendfile(2) without
+copying it through Python. With MEDIA_SENDFILE set, the transfer is handed
+to the front server instead (X-Sendfile for Apache/lighttpd,
+X-Accel-Redirect for nginx), which then does ranges itself.
+"""
+import mimetypes
+import os
+import re
+from datetime import datetime, timezone
+from uuid import uuid4
+
+from flask import current_app, request
+from werkzeug.http import http_date, is_resource_modified
+from werkzeug.wsgi import wrap_file
+
+from app.assets import IMMUTABLE
+
+MAX_RANGES = 16  # more than this in one request is ignored and the whole file is sent
+CHUNK_SIZE = 256 * 1024
+CONTENT_ADDRESSED = re.compile(r'(^|/)[0-9a-f]{64}\.\w+$')
+
+
+def _validators(path, name, st):
+    """(strong ETag, Last-Modified, Cache-Control) for a stored file."""
+    modified = datetime.fromtimestamp(int(st.st_mtime), timezone.utc)
+    if CONTENT_ADDRESSED.search(name):
+        # the name is the content hash, so it never changes
+        return os.path.basename(name).split('.')[0], modified, IMMUTABLE
+    return f'{st.st_size:x}-{int(st.st_mtime):x}', modified, 'public, no-cache'
+
+
+def _satisfiable(ranges, size):
+    """Clamp parsed (start, stop) pairs to the file; drops unsatisfiable ones."""
+    spans = []
+    for start, stop in ranges:
+        if start < 0:               # "-500": the last 500 bytes
+            start, stop = max(size + start, 0), size
+        else:                       # "500-" or "500-999"
+            stop = size if stop is None else min(stop, size)
+        if start < stop:
+            spans.append((start, stop))
+    return spans
+
+
+def _range_applies(etag, modified):
+    """False when an If-Range validator no longer matches the file."""
+    if 'If-Range' not in request.headers:
+        return True
+    if_range = request.if_range
+    if if_range.etag is not None:
+        return if_range.etag == etag
+    return if_range.date is not None and if_range.date >= modified
+
+
+def _multipart(path, spans, size, mimetype, boundary):
+    """(body generator, exact length) for a multipart/byteranges response."""
+    heads = [(f'\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n'
+              f'Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n').encode()
+             for start, stop in spans]
+    tail = f'\r\n--{boundary}--\r\n'.encode()
+    length = sum(len(h) for h in heads) + sum(stop - start for start, stop in spans) + len(tail)
+
+    def body():
+        with open(path, 'rb') as f:
+            for head, (start, stop) in zip(heads, spans):
+                yield head
+                f.seek(start)
+                left = stop - start
+                while left:
+                    chunk = f.read(min(CHUNK_SIZE, left))
+                    if not chunk:
+                        return
+                    left -= len(chunk)
+                    yield chunk
+        yield tail
+
+    return body(), length
+
+
+def _offload(path, name, headers):
+    mode = current_app.config['MEDIA_SENDFILE']
+    if mode == 'x-accel':
+        headers['X-Accel-Redirect'] = current_app.config['MEDIA_ACCEL_PREFIX'].rstrip('/') + '/' + name
+    else:
+        headers['X-Sendfile'] = path
+    return current_app.response_class(status=200, headers=headers)
+
+
+def send_ranged(path, name, mimetype=None):
+    """Response for the file at `path`; `name` is its key below UPLOAD_FOLDER."""
+    st = os.stat(path)
+    size = st.st_size
+    mimetype = mimetype or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    etag, modified, cache_control = _validators(path, name, st)
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': f'"{etag}"',
+        'Last-Modified': http_date(modified),
+        'Cache-Control': cache_control,
+        'Content-Type': mimetype,
+    }
+    response_class = current_app.response_class
+
+    if current_app.config['MEDIA_SENDFILE']:
+        return _offload(path, name, headers)
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=modified):
+        return response_class(status=304, headers=headers)
+
+    spans = None
+    requested = request.range
+    if requested is not None and requested.units == 'bytes' and _range_applies(etag, modified):
+        if len(requested.ranges) <= MAX_RANGES:
+            spans = _satisfiable(requested.ranges, size)
+            if not spans:
+                headers['Content-Range'] = f'bytes */{size}'
+                return response_class(status=416, headers=headers)
+
+    if spans is None or spans == [(0, size)]:
+        f = open(path, 'rb')
+        headers['Content-Length'] = str(size)
+        return response_class(wrap_file(request.environ, f), status=200, headers=headers,
+                              direct_passthrough=True)
+
+    if len(spans) == 1:
+        start, stop = spans[0]
+        f = open(path, 'rb')
+        f.seek(start)  # the file wrapper / sendfile starts from the current offset
+        headers['Content-Range'] = f'bytes {start}-{stop - 1}/{size}'
+        headers['Content-Length'] = str(stop - start)
+        return response_class(_limited(request.environ, f, stop - start), status=206,
+                              headers=headers, direct_passthrough=True)
+
+    boundary = uuid4().hex
+    body, length = _multipart(path, spans, size, mimetype, boundary)
+    headers['Content-Type'] = f'multipart/byteranges; boundary={boundary}'
+    headers['Content-Length'] = str(length)
+    return response_class(body, status=206, headers=headers, direct_passthrough=True)
+
+
+def _limited(environ, f, length):
+    """A file wrapper that stops after `length` bytes.
+
+    gunicorn's sendfile path sizes the copy from Content-Length; servers
+    without a file wrapper fall back to iterating, which must stop too.
+    """
+    wrapper = environ.get('wsgi.file_wrapper')
+    if wrapper is not None and environ.get('SERVER_SOFTWARE', '').startswith('gunicorn'):
+        return wrapper(f, CHUNK_SIZE)
+    return _read_upto(f, length)
+
+
+def _read_upto(f, length):
+    try:
+        while length:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
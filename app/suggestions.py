@@ -0,0 +1,179 @@
+"""Who-to-follow suggestions computed from the follow graph and likes.
+
+`flask suggestions-refresh` loads every follow edge and every (liker,
+author) pair into SciPy sparse matrices, F (user follows user) and L
+(user liked a post by author). The score of a suggestion v for user u is:
+
+    (F @ F)[u, v]                   people u follows who follow v
+  + CO_LIKE_WEIGHT * ((F + I) @ L)[u, v]
+                                    u and the people u follows liked v's posts
+
+Accounts u already follows, and u itself, are dropped. The top
+SUGGESTIONS_PER_USER per user go into follow_suggestion. An incremental run
+only recomputes the rows of users listed in graph_change, which
+follows and likes fill in through mark_changed, and of their followers.
+"""
+import numpy as np
+from flask import current_app
+from scipy import sparse
+from sqlalchemy import or_, select
+
+from app import db
+from app.models import FollowSuggestion, GraphChange, Like, Post, User, followers, insert_ignore
+
+CO_LIKE_WEIGHT = 0.5
+
+
+# ---------------- SCORING ----------------
+def _matrix(rows, index, shape):
+    """Binary CSR matrix from (row user id, column user id) pairs."""
+    if not rows:
+        return sparse.csr_matrix(shape, dtype=np.float64)
+    pairs = np.array(rows, np.int64)
+    r, c = np.searchsorted(index, pairs[:, 0]), np.searchsorted(index, pairs[:, 1])
+    m = sparse.csr_matrix((np.ones(len(pairs)), (r, c)), shape=shape)
+    m.data[:] = 1.0  # duplicate pairs were summed
+    return m
+
+
+def load_graph(users=None):
+    """(sorted user ids, their follower counts, F, L).
+
+    With `users`, only the edges their scores depend on are read: their own
+    follows and likes, and those of the accounts they follow.
+    """
+    accounts = db.session.execute(select(User.id, User.follower_count).order_by(User.id)).all()
+    index = np.array([a.id for a in accounts], np.int64)
+    popularity = np.array([a.follower_count for a in accounts], np.int64)
+    shape = (len(index), len(index))
+    follow_query = select(followers.c.follower_id, followers.c.followed_id)
+    like_query = (select(Like.user_id, Post.user_id).join(Post, Post.id == Like.post_id)
+                  .where(Like.user_id.isnot(None)).distinct())
+
+    if users is None:
+        follows = db.session.execute(follow_query).all()
+        liked = db.session.execute(like_query).all()
+    else:
+        follows, liked = [], []
+        for chunk in _chunks(users):
+            followed = select(followers.c.followed_id).where(followers.c.follower_id.in_(chunk))
+            follows += db.session.execute(follow_query.where(or_(
+                followers.c.follower_id.in_(chunk), followers.c.follower_id.in_(followed)))).all()
+            liked += db.session.execute(like_query.where(or_(
+                Like.user_id.in_(chunk), Like.user_id.in_(followed)))).all()
+    return index, popularity, _matrix(follows, index, shape), _matrix(liked, index, shape)
+
+
+def score(F, L, rows=None):
+    """Suggestion scores for the given row positions (all users by default)."""
+    Fr = F if rows is None else F[rows]
+    eye = sparse.identity(F.shape[0], format='csr')
+    Ir = eye if rows is None else eye[rows]
+    S = (Fr @ F + CO_LIKE_WEIGHT * ((Fr + Ir) @ L)).tocsr()
+    S = S - S.multiply(Fr)            # already followed
+    S = S - S.multiply(Ir)            # yourself
+    S.eliminate_zeros()
+    return S.tocoo()
+
+
+def top_k(S, k, popularity):
+    """(row, column, score, rank) arrays for the k best columns of each row.
+
+    Ties go to the account with more followers, then the lower position.
+    """
+    order = np.lexsort((S.col, -popularity[S.col], -S.data, S.row))
+    row, col, data = S.row[order], S.col[order], S.data[order]
+    rank = np.arange(len(row)) - np.searchsorted(row, row)
+    keep = rank < k
+    return row[keep], col[keep], data[keep], rank[keep] + 1
+
+
+def refresh(full=False):
+    """Recompute suggestions; returns (users refreshed, rows written).
+
+    Incremental runs take the users in graph_change and their followers.
+    The marks are cleared before the graph is read, so a follow that lands
+    during the run marks the user again for the next one.
+    """
+    table = FollowSuggestion.__table__
+    if full:
+        users = None
+        db.session.execute(GraphChange.__table__.delete())
+    else:
+        changed = db.session.execute(select(GraphChange.user_id)).scalars().all()
+        if not changed:
+            return 0, 0
+        for chunk in _chunks(changed):
+            db.session.execute(GraphChange.__table__.delete().where(GraphChange.user_id.in_(chunk)))
+        users = _with_followers(changed)
+    db.session.commit()
+
+    index, popularity, F, L = load_graph(users)
+    rows = None
+    if users is not None:
+        users = np.intersect1d(np.array(users, np.int64), index)
+        rows = np.searchsorted(index, users)
+    S = score(F, L, rows)
+    r, c, data, rank = top_k(S, current_app.config['SUGGESTIONS_PER_USER'], popularity)
+
+    owners = index if rows is None else users
+    if users is None:
+        db.session.execute(table.delete())
+    else:
+        for chunk in _chunks(users.tolist()):
+            db.session.execute(table.delete().where(table.c.user_id.in_(chunk)))
+    entries = [{'user_id': u, 'rank': n, 'suggested_id': v, 'score': s}
+               for u, v, s, n in zip(owners[r].tolist(), index[c].tolist(),
+                                     data.tolist(), rank.tolist())]
+    if entries:
+        db.session.execute(table.insert(), entries)
+    db.session.commit()
+    return (len(index) if users is None else len(users)), len(entries)
+
+
+def _with_followers(user_ids):
+    """The users plus everyone following them: u's scores read the follow
+    and like rows of every account u follows."""
+    users = set(user_ids)
+    for chunk in _chunks(user_ids):
+        users.update(db.session.execute(
+            select(followers.c.follower_id).where(followers.c.followed_id.in_(chunk))
+        ).scalars())
+    return sorted(users)
+
+
+def _chunks(values, size=500):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# ---------------- HOOKS ----------------
+def mark_changed(*user_ids):
+    """Queue the suggestions that depend on these users' follows and likes.
+
+    Only the users themselves are written, so a like or follow costs one
+    row however many followers they have; refresh() expands them to their
+    followers when it runs.
+    """
+    ids = sorted(set(user_ids))
+    if ids:
+        db.session.execute(insert_ignore(GraphChange.__table__), [{'user_id': i} for i in ids])
+
+
+def drop(user_id, suggested_id):
+    """Remove one suggestion, e.g. once it has been followed."""
+    table = FollowSuggestion.__table__
+    db.session.execute(table.delete().where(table.c.user_id == user_id,
+                                            table.c.suggested_id == suggested_id))
+
+
+# ---------------- READING ----------------
+def suggestions_for(user_id, limit=5):
+    """The best `limit` suggestions for a user, as User objects, in one query."""
+    return db.session.execute(
+        select(User)
+        .join(FollowSuggestion, FollowSuggestion.suggested_id == User.id)
+        .where(FollowSuggestion.user_id == user_id)
+        .order_by(FollowSuggestion.rank)
+        .limit(limit)
+    ).scalars().all()
@@ -0,0 +1,57 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from app import db
+
+log = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+def _get_executor(workers):
+    # gunicorn forks after import, so each worker process needs its own pool
+    global _executor, _executor_pid
+    with _lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=workers,
+                                           thread_name_prefix='coolstack-task')
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) off the request thread inside an app context.
+
+    TASK_WORKERS=0 runs the job inline, which is handy for the shell and
+    for debugging.
+    """
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            try:
+                fn(*args, **kwargs)
+            except Exception:
+                log.exception('background task %s failed', getattr(fn, '__name__', fn))
+                db.session.rollback()
+
+    workers = app.config.get('TASK_WORKERS', 2)
+    if not workers:
+        run()
+        return None
+    return _get_executor(workers).submit(run)
+
+
+def drain():
+    """Wait for queued jobs to finish (scripts that exit right after a burst)."""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True)
@@ -0,0 +1,135 @@
+from flask import current_app
+from sqlalchemy import literal, select
+from sqlalchemy.orm import joinedload
+
+from app import db, tasks
+from app.feed import FEED_PAGE_SIZE, FeedPage, after_cursor, encode_cursor
+from app.models import User, Post, TimelineEntry, followers, insert_ignore
+
+COLUMNS = ['user_id', 'post_id', 'author_id', 'date_posted']
+
+
+def celebrity_threshold():
+    return current_app.config['TIMELINE_CELEBRITY_FOLLOWERS']
+
+
+def _insert(rows):
+    """INSERT ... SELECT into the timeline, skipping entries already there."""
+    table = TimelineEntry.__table__
+    return db.session.execute(insert_ignore(table).from_select(COLUMNS, rows)).rowcount
+
+
+def fan_out(post_id):
+    """Background job: push a new post into its author's and every follower's inbox.
+
+    Authors with more followers than TIMELINE_CELEBRITY_FOLLOWERS are
+    skipped; their posts are pulled at read time instead.
+    """
+    post = db.session.get(Post, post_id)
+    if post is None or post.author.follower_count >= celebrity_threshold():
+        return
+
+    values = [literal(post.id), literal(post.user_id), literal(post.date_posted)]
+    _insert(select(literal(post.user_id), *values))
+    _insert(select(followers.c.follower_id, *values)
+            .where(followers.c.followed_id == post.user_id))
+    db.session.commit()
+
+
+def queue_fan_out(post):
+    tasks.submit(fan_out, post.id)
+
+
+def backfill(user_id, author_id, limit=None):
+    """Background job: copy an author's recent posts into a new follower's inbox.
+
+    Joined against the follow edge so a quick unfollow that beats this job
+    to the database leaves nothing behind.
+    """
+    author = db.session.get(User, author_id)
+    if author is None or author.follower_count >= celebrity_threshold():
+        return
+
+    recent = (select(Post.id).where(Post.user_id == author_id)
+              .order_by(Post.date_posted.desc())
+              .limit(limit or current_app.config['TIMELINE_BACKFILL'])
+              .subquery())
+    _insert(select(followers.c.follower_id, Post.id, Post.user_id, Post.date_posted)
+            .join(Post, Post.user_id == followers.c.followed_id)
+            .where(followers.c.follower_id == user_id,
+                   followers.c.followed_id == author_id,
+                   Post.id.in_(select(recent.c.id))))
+    db.session.commit()
+
+
+def queue_backfill(user, author):
+    tasks.submit(backfill, user.id, author.id)
+
+
+def retract_post(post_id):
+    """Remove a post from every inbox. Runs in the caller's transaction."""
+    TimelineEntry.query.filter_by(post_id=post_id).delete(synchronize_session=False)
+
+
+def retract_author(user_id, author_id):
+    """Remove an unfollowed author's posts from one inbox."""
+    TimelineEntry.query.filter_by(user_id=user_id, author_id=author_id).delete(
+        synchronize_session=False
+    )
+
+
+def rebuild():
+    """Recompute every inbox from the follow graph. Returns rows written."""
+    TimelineEntry.query.delete(synchronize_session=False)
+    fanned_out = User.follower_count < celebrity_threshold()
+
+    written = _insert(select(Post.user_id, Post.id, Post.user_id, Post.date_posted)
+                      .join(User, User.id == Post.user_id)
+                      .where(fanned_out))
+    written += _insert(select(followers.c.follower_id, Post.id, Post.user_id, Post.date_posted)
+                       .join(Post, Post.user_id == followers.c.followed_id)
+                       .join(User, User.id == followers.c.followed_id)
+                       .where(fanned_out))
+    db.session.commit()
+    return written
+
+
+def timeline_page(user, cursor=None, limit=FEED_PAGE_SIZE):
+    """One keyset page of the posts by `user` and the accounts they follow.
+
+    The inbox is one indexed range scan. Celebrity authors (never fanned
+    out) are merged in from Post, which is indexed on user_id; at most a
+    handful of them are followed by any one user.
+    """
+    def newest(query, date_col, id_col):
+        query = after_cursor(query, date_col, id_col, cursor)
+        return query.order_by(date_col.desc(), id_col.desc()).limit(limit + 1).all()
+
+    rows = newest(
+        db.session.query(TimelineEntry.date_posted, TimelineEntry.post_id)
+        .filter(TimelineEntry.user_id == user.id),
+        TimelineEntry.date_posted, TimelineEntry.post_id,
+    )
+
+    threshold = celebrity_threshold()
+    celebrities = [uid for (uid,) in db.session.query(User.id)
+                   .join(followers, followers.c.followed_id == User.id)
+                   .filter(followers.c.follower_id == user.id,
+                           User.follower_count >= threshold)]
+    if user.follower_count >= threshold:
+        celebrities.append(user.id)
+    if celebrities:
+        rows += newest(
+            db.session.query(Post.date_posted, Post.id).filter(Post.user_id.in_(celebrities)),
+            Post.date_posted, Post.id,
+        )
+
+    rows = sorted({tuple(r) for r in rows}, reverse=True)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*rows[-1])
+
+    ids = [post_id for _, post_id in rows]
+    by_id = {p.id: p for p in Post.query.options(joinedload(Post.author)).filter(Post.id.in_(ids))}
+    return FeedPage([by_id[i] for i in ids if i in by_id], next_cursor)
@@ -0,0 +1,113 @@
+"""Trending lists: posts ranked by their recent likes and comments.
+
+Every interaction inside TRENDING_WINDOW_HOURS adds its weight to the
+post's score, halved for every TRENDING_HALF_LIFE_HOURS of age. `flask
+trending-refresh` recomputes the site-wide list and one list per category
+in a single batch: it pulls (post, category, time) tuples for the window,
+scores them with NumPy and rewrites the trending_score table. Pages then
+read a slice of that table by rank.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+
+from app import db
+from app.cache import cache
+from app.feed import FEED_PAGE_SIZE, FeedPage
+from app.models import Comment, Like, Post, TrendingScore
+
+SCOPE_ALL = ''
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 3.0  # a comment costs more effort than a click
+
+
+# ---------------- SCORING ----------------
+def _interactions(post_col, time_col, since):
+    """(post ids, categories, datetimes) of the interactions since `since`."""
+    rows = db.session.execute(
+        select(post_col, Post.category, time_col)
+        .join(Post, Post.id == post_col)
+        .where(time_col >= since)
+    ).all()
+    if not rows:
+        return np.empty(0, np.int64), np.empty(0, object), np.empty(0, 'datetime64[us]')
+    post_ids, categories, times = zip(*rows)
+    return (np.array(post_ids, np.int64), np.array(categories, object),
+            np.array(times, 'datetime64[us]'))
+
+
+def decayed_scores(post_ids, ages, weights, half_life):
+    """Sum weight * 0.5 ** (age / half_life) per post.
+
+    Returns (unique post ids, their scores, index of each id's first row).
+    """
+    ids, first, slot = np.unique(post_ids, return_index=True, return_inverse=True)
+    return ids, np.bincount(slot, weights=weights * np.exp2(-ages / half_life)), first
+
+
+def rank(ids, scores, categories, size):
+    """{scope: [(post_id, score), ...]} best first, at most `size` per scope."""
+    # highest score first; ties go to the newer post
+    order = np.lexsort((-ids, -scores))
+    lists = {SCOPE_ALL: order[:size]}
+    for category in sorted({c for c in categories.tolist() if c}):
+        lists[category] = order[categories[order] == category][:size]
+    return {scope: list(zip(ids[idx].tolist(), scores[idx].tolist()))
+            for scope, idx in lists.items()}
+
+
+def refresh(now=None):
+    """Recompute every trending list; returns how many entries were written."""
+    config = current_app.config
+    now = now or datetime.utcnow()
+    since = now - timedelta(hours=config['TRENDING_WINDOW_HOURS'])
+
+    like_posts, like_cats, like_times = _interactions(Like.post_id, Like.created_at, since)
+    comment_posts, comment_cats, comment_times = _interactions(
+        Comment.post_id, Comment.date_posted, since)
+
+    post_ids = np.concatenate([like_posts, comment_posts])
+    categories = np.concatenate([like_cats, comment_cats])
+    times = np.concatenate([like_times, comment_times])
+    weights = np.concatenate([np.full(len(like_posts), LIKE_WEIGHT),
+                              np.full(len(comment_posts), COMMENT_WEIGHT)])
+    ages = (np.datetime64(now, 'us') - times) / np.timedelta64(1, 'h')
+
+    rows = []
+    if len(post_ids):
+        ids, scores, first = decayed_scores(post_ids, ages, weights,
+                                            config['TRENDING_HALF_LIFE_HOURS'])
+        for scope, entries in rank(ids, scores, categories[first], config['TRENDING_SIZE']).items():
+            rows.extend({'scope': scope, 'rank': n, 'post_id': post_id, 'score': score}
+                        for n, (post_id, score) in enumerate(entries, 1))
+
+    # one transaction, so readers see the old lists or the new ones
+    table = TrendingScore.__table__
+    db.session.execute(table.delete())
+    if rows:
+        db.session.execute(table.insert(), rows)
+    db.session.commit()
+    cache.invalidate('trending')
+    return len(rows)
+
+
+# ---------------- READING ----------------
+def trending_page(category=None, after=0, limit=FEED_PAGE_SIZE):
+    """One page of a trending list; the cursor is the last rank shown."""
+    rows = (db.session.query(Post, TrendingScore.rank)
+            .join(TrendingScore, TrendingScore.post_id == Post.id)
+            .options(joinedload(Post.author))
+            .filter(TrendingScore.scope == (category or SCOPE_ALL),
+                    TrendingScore.rank > after)
+            .order_by(TrendingScore.rank)
+            .limit(limit + 1)
+            .all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].rank
+    return FeedPage([post for post, _ in rows], next_cursor)
@@ -0,0 +1,161 @@
+"""Chunked, resumable uploads for files too big for one form post.
+
+A client starts an upload with its kind, file name and total size, PUTs
+the bytes in order with Content-Range, then finalizes it. Each chunk is
+appended straight to a .part file under UPLOAD_TMP_FOLDER, so nothing is
+buffered in memory and a dropped connection only loses the chunk in
+flight: the length of the .part file is the offset to resume from. Sizes
+are checked against the per-kind cap before any body is read.
+
+A finalized upload is claimed by create_post / edit_profile through a
+hidden `<field>_upload` value and stored like any other upload.
+"""
+import os
+from datetime import datetime
+from uuid import uuid4
+
+from flask import abort, current_app
+from werkzeug.utils import secure_filename
+
+from app import db
+from app.media import CHUNK_SIZE, UPLOAD_KINDS, hash_file, max_upload_size
+from app.models import UploadSession
+from app.storage import acquire_blob
+
+try:
+    import fcntl
+except ImportError:  # Windows; concurrent chunks of one upload are then not locked out
+    fcntl = None
+
+
+def _part_path(upload):
+    return os.path.join(current_app.config['UPLOAD_TMP_FOLDER'], 'chunked', f'{upload.id}.part')
+
+
+def received(upload):
+    """Bytes stored so far, i.e. where the next chunk must start."""
+    try:
+        return os.path.getsize(_part_path(upload))
+    except FileNotFoundError:
+        return 0
+
+
+# ---------------- WRITING ----------------
+def start(user, kind, filename, size):
+    """Open an upload of `size` bytes; refused before any data is sent."""
+    if kind not in UPLOAD_KINDS:
+        abort(400, f'kind must be one of {", ".join(sorted(UPLOAD_KINDS))}')
+    ext = os.path.splitext(secure_filename(filename))[1].lower()
+    if ext not in UPLOAD_KINDS[kind][0]:
+        abort(400, f'{kind} accepts {", ".join(sorted(UPLOAD_KINDS[kind][0]))} files')
+    limit = max_upload_size(kind)
+    if size > limit:
+        abort(413, f'{kind} files are limited to {limit} bytes')
+
+    upload = UploadSession(id=uuid4().hex, user_id=user.id, kind=kind, ext=ext, size=size)
+    path = _part_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, 'wb').close()
+    db.session.add(upload)
+    db.session.commit()
+    return upload
+
+
+def append(upload, start, length, stream):
+    """Write `length` bytes read from `stream` at offset `start`; returns the new offset.
+
+    `start` has to be the current offset, so a retried chunk that already
+    landed is answered with 409 rather than written twice.
+    """
+    if upload.sha256 is not None:
+        abort(409, 'upload is already finalized')
+    if start + length > upload.size:
+        abort(413, f'upload was declared as {upload.size} bytes')
+
+    with open(_part_path(upload), 'ab') as out:
+        if fcntl is not None:
+            try:
+                fcntl.flock(out, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                abort(409, 'another chunk of this upload is being written')
+        offset = os.fstat(out.fileno()).st_size
+        if start != offset:
+            abort(409, f'expected a chunk starting at byte {offset}')
+        # whatever arrives before a disconnect stays written; the client resumes after it
+        left = length
+        while left:
+            chunk = stream.read(min(CHUNK_SIZE, left))
+            if not chunk:
+                break
+            out.write(chunk)
+            left -= len(chunk)
+    return start + length - left
+
+
+def finalize(upload):
+    """Check every byte arrived and record the content hash."""
+    if upload.sha256 is None:
+        if received(upload) != upload.size:
+            abort(409, f'only {received(upload)} of {upload.size} bytes received')
+        upload.sha256 = hash_file(_part_path(upload))
+        db.session.commit()
+    return upload
+
+
+def cancel(upload):
+    _remove(upload)
+    db.session.commit()
+
+
+def _remove(upload):
+    try:
+        os.remove(_part_path(upload))
+    except FileNotFoundError:
+        pass
+    db.session.delete(upload)
+
+
+# ---------------- READING ----------------
+def get_or_404(upload_id, user):
+    """One of the user's uploads; other people's ids look missing."""
+    upload = db.session.get(UploadSession, upload_id)
+    if upload is None or upload.user_id != user.id:
+        abort(404, 'no such upload')
+    return upload
+
+
+# ---------------- CLAIMING ----------------
+def claim(upload_id, kind, user):
+    """Store a finalized upload like save_upload does; returns its name within `kind`.
+
+    Runs in the caller's transaction, which takes the blob reference and
+    drops the upload session together. The .part file is only moved into
+    storage once that commits, so after a rollback the upload can be
+    claimed again.
+    """
+    if not upload_id:
+        return None
+    upload = get_or_404(upload_id, user)
+    if upload.kind != kind or upload.sha256 is None:
+        abort(400, 'that upload is not a finished ' + kind)
+    part = _part_path(upload)
+    if not os.path.exists(part):
+        abort(409, 'the data of that upload is gone; upload the file again')
+    # a double submit gets the upload once; the other request waits for the row, then 409
+    taken = UploadSession.query.filter_by(id=upload.id).delete(synchronize_session=False)
+    db.session.expunge(upload)
+    if not taken:
+        abort(409, 'that upload has already been used')
+    filename = f'{upload.sha256[:2]}/{upload.sha256}{upload.ext}'
+    acquire_blob(f'{kind}/{filename}', part, upload.size, keep_on_rollback=True)
+    return filename
+
+
+def expire(max_age):
+    """Drop uploads started more than `max_age` ago and never claimed."""
+    cutoff = datetime.utcnow() - max_age
+    stale = UploadSession.query.filter(UploadSession.created_at < cutoff).all()
+    for upload in stale:
+        _remove(upload)
+    db.session.commit()
+    return len(stale)
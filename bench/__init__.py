@@ -0,0 +1,13 @@
+"""Load-test and benchmark harness for the hot endpoints.
+
+    python -m bench                         # temp SQLite, in-process test client
+    python -m bench --db postgresql://localhost/coolstack_bench --yes-drop
+    python -m bench --gunicorn --workers 4 --concurrency 16
+    python -m bench --save-baseline bench/baseline.json
+    python -m bench --baseline bench/baseline.json   # exit 1 on regression
+
+Every run reseeds the database from --seed, so query counts are exactly
+repeatable and latencies are comparable between runs on the same machine.
+Queries per request come from the app's own Server-Timing header
+(PERF_SAMPLE_RATE=1 is forced for the run).
+"""
@@ -0,0 +1,167 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bench
+from bench.runner import SCENARIOS, HTTPSession, TestClientSession, User, compare, run_scenario
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(prog='python -m bench', description=bench.__doc__,
+                                formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument('--db', help='database URL (default: a throwaway SQLite file)')
+    p.add_argument('--yes-drop', action='store_true',
+                   help='allow dropping every table in a --db you passed')
+    p.add_argument('--seed', type=int, default=42)
+
+    v = p.add_argument_group('data volumes')
+    v.add_argument('--users', type=int, default=200)
+    v.add_argument('--posts', type=int, default=2000)
+    v.add_argument('--likes-per-post', type=int, default=5, help='mean')
+    v.add_argument('--comments-per-post', type=int, default=4, help='mean')
+    v.add_argument('--reply-depth', type=int, default=3)
+    v.add_argument('--follows-per-user', type=int, default=20)
+
+    r = p.add_argument_group('load')
+    r.add_argument('--endpoints', default=','.join(SCENARIOS),
+                   help='comma separated, from: ' + ', '.join(SCENARIOS))
+    r.add_argument('--requests', type=int, default=200, help='timed requests per endpoint')
+    r.add_argument('--warmup', type=int, default=20)
+    r.add_argument('--sessions', type=int, default=8, help='distinct logged-in users')
+    r.add_argument('--cache', default='memory', choices=['memory', 'sqlite', 'null'])
+    r.add_argument('--gunicorn', action='store_true', help='drive a real gunicorn over HTTP')
+    r.add_argument('--workers', type=int, default=2)
+    r.add_argument('--worker-class', default='gthread', choices=['sync', 'gthread', 'gevent'])
+    r.add_argument('--threads', type=int, default=4, help='per worker with gthread')
+    r.add_argument('--concurrency', type=int, default=8, help='client threads with --gunicorn')
+    r.add_argument('--port', type=int, default=8123)
+
+    o = p.add_argument_group('output')
+    o.add_argument('--out', help='write the results JSON here')
+    o.add_argument('--save-baseline', metavar='PATH', help='write the results as a baseline')
+    o.add_argument('--baseline', metavar='PATH', help='compare against this baseline')
+    o.add_argument('--tolerance', type=float, default=0.2,
+                   help='allowed latency growth before it is a regression (0.2 = 20%%)')
+    return p.parse_args(argv)
+
+
+def _wait_for_port(port, proc, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        with socket.socket() as s:
+            if s.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f'gunicorn did not listen on :{port} within {timeout}s')
+
+
+def _print_table(results):
+    cols = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'queries_per_request', 'errors')
+    print(f"{'endpoint':<16}" + ''.join(f'{c:>21}' for c in cols))
+    for name, row in results['endpoints'].items():
+        print(f'{name:<16}' + ''.join(f'{str(row[c]):>21}' for c in cols))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix='coolstack-bench-')
+
+    if args.db and not args.yes_drop:
+        sys.exit('refusing to drop and reseed --db without --yes-drop')
+    db_url = args.db or 'sqlite:///' + os.path.join(workdir, 'bench.db')
+
+    env = {
+        'DATABASE_URL': db_url,
+        'CACHE_BACKEND': args.cache,
+        'CACHE_PATH': os.path.join(workdir, 'cache.sqlite'),
+        'UPLOAD_TMP_FOLDER': os.path.join(workdir, 'upload_tmp'),
+        'PERF_SAMPLE_RATE': '1',
+    }
+    os.environ.update(env)
+
+    from app import create_app, db, likebuffer, tasks
+    from bench.seed import seed
+
+    volumes = {
+        'users': args.users, 'posts': args.posts, 'likes_per_post': args.likes_per_post,
+        'comments_per_post': args.comments_per_post, 'reply_depth': args.reply_depth,
+        'follows_per_user': args.follows_per_user,
+    }
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        written = seed(volumes, args.seed)
+        db.session.remove()
+    print(f'seeded in {time.perf_counter() - started:.1f}s: {written}')
+
+    server, pool = None, None
+    try:
+        if args.gunicorn:
+            server = subprocess.Popen(
+                [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py',
+                 '-b', f'127.0.0.1:{args.port}', '--log-level', 'warning', 'app:create_app()'],
+                env={**os.environ, **env, 'WEB_CONCURRENCY': str(args.workers),
+                     'GUNICORN_WORKER_CLASS': args.worker_class,
+                     'GUNICORN_THREADS': str(args.threads), 'GUNICORN_ACCESS_LOG': ''},
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            )
+            _wait_for_port(args.port, server)
+            base = f'http://127.0.0.1:{args.port}'
+            users = [User(HTTPSession(base), uid) for uid in range(1, args.sessions + 1)]
+            pool = ThreadPoolExecutor(max_workers=args.concurrency)
+        else:
+            users = [User(TestClientSession(app), uid) for uid in range(1, args.sessions + 1)]
+
+        rnd = random.Random(args.seed)
+        results = {
+            'mode': f'gunicorn/{args.worker_class}' if args.gunicorn else 'test_client',
+            'database': db_url.split(':', 1)[0],
+            'volumes': volumes,
+            'seed': args.seed,
+            'endpoints': {},
+        }
+        for name in args.endpoints.split(','):
+            results['endpoints'][name] = run_scenario(
+                name, users, rnd, volumes, args.requests, args.warmup, pool
+            )
+    finally:
+        if pool:
+            pool.shutdown()
+        if server:
+            server.terminate()
+            server.wait(10)
+        tasks.drain()
+        with app.app_context():
+            buffer = likebuffer.get_buffer()
+            if buffer is not None:
+                buffer.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    _print_table(results)
+    for path in filter(None, (args.out, args.save_baseline)):
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'wrote {path}')
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.tolerance)
+        for line in problems:
+            print('REGRESSION', line)
+        if problems:
+            sys.exit(1)
+        print('no regressions against', args.baseline)
+
+
+if __name__ == '__main__':
+    main()
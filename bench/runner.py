@@ -0,0 +1,185 @@
+import http.cookiejar
+import math
+import random
+import re
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+from bench.seed import PASSWORD, WORDS, CATEGORIES
+
+_CSRF = re.compile(r'name="csrf-token" content="([^"]+)"')
+_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class TestClientSession:
+    """In-process: app.test_client(), no network or WSGI server in the way."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None, headers=None):
+        r = self.client.open(path, method=method, data=data, headers=headers or {})
+        return Response(r.status_code, r.headers, r.get_data(as_text=True))
+
+
+class HTTPSession:
+    """Against a real server; keeps cookies like a browser would."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            _NoRedirect(),
+        )
+
+    def request(self, method, path, data=None, headers=None):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method,
+                                     headers=headers or {})
+        try:
+            with self.opener.open(req, timeout=30) as r:
+                return Response(r.status, r.headers, r.read().decode())
+        except urllib.error.HTTPError as e:
+            return Response(e.code, e.headers, e.read().decode())
+
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # a 302 after a POST is the answer we time, not the page behind it
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+class User:
+    """A logged-in bench account with its CSRF token."""
+
+    def __init__(self, session, uid):
+        self.session = session
+        self.uid = uid
+        html = session.request('GET', '/main/login').body
+        self.csrf = _CSRF.search(html).group(1)
+        r = self.post('/main/login', {'email': f'bench{uid}@example.com', 'password': PASSWORD})
+        if r.status != 302:
+            raise RuntimeError(f'login failed for bench{uid}: HTTP {r.status}')
+
+    def get(self, path):
+        return self.session.request('GET', path)
+
+    def post(self, path, data=None):
+        return self.session.request('POST', path, data=data or {},
+                                    headers={'X-CSRFToken': self.csrf})
+
+
+# name -> issues one request as `user`, picking targets with `rnd`
+SCENARIOS = {
+    'home': lambda u, rnd, v: u.get('/main/home'),
+    'view_post': lambda u, rnd, v: u.get(f"/main/post/{rnd.randint(1, v['posts'])}"),
+    'fetch_comments': lambda u, rnd, v: u.get(f"/main/comments/{rnd.randint(1, v['posts'])}"),
+    'search': lambda u, rnd, v: u.get(f'/main/search?q={rnd.choice(WORDS)}'),
+    'like_post': lambda u, rnd, v: u.post(f"/main/like/{rnd.randint(1, v['posts'])}"),
+    'follow': lambda u, rnd, v: u.post(f"/main/follow/{_other_user(u, rnd, v)}"),
+    'category': lambda u, rnd, v: u.get(f'/main/category/{rnd.choice(CATEGORIES)}'),
+    'trending': lambda u, rnd, v: u.get(f"/main/trending?category={rnd.choice(['', *CATEGORIES])}"),
+    'api_posts': lambda u, rnd, v: u.get('/api/v1/posts?limit=20'),
+    'api_batch': lambda u, rnd, v: u.get('/api/v1/posts/batch?fields=id,like_count,comment_count,liked&ids='
+                                         + ','.join(str(rnd.randint(1, v['posts'])) for _ in range(50))),
+    'create_post': lambda u, rnd, v: u.post('/main/create_post', {
+        'title': ' '.join(rnd.choice(WORDS) for _ in range(4)),
+        'content': ' '.join(rnd.choice(WORDS) for _ in range(40)),
+        'category': rnd.choice(CATEGORIES),
+    }),
+}
+OK_STATUS = {200, 302, 304}
+
+
+def _other_user(user, rnd, volumes):
+    while True:
+        uid = rnd.randint(1, volumes['users'])
+        if uid != user.uid:
+            return uid
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def run_scenario(name, users, rnd, volumes, requests, warmup, pool=None):
+    """Fire `requests` timed calls (after `warmup` untimed ones).
+
+    With a thread pool the calls overlap, which is what throughput means
+    against a multi-worker server; in-process runs are sequential.
+    """
+    make = SCENARIOS[name]
+    jobs = [(users[i % len(users)], rnd.random()) for i in range(warmup + requests)]
+
+    def call(job):
+        user, seed = job
+        local = random.Random(seed)
+        started = time.perf_counter()
+        r = make(user, local, volumes)
+        elapsed = time.perf_counter() - started
+        match = _QUERIES.search(r.headers.get('Server-Timing', '') or '')
+        return r.status, elapsed, int(match.group(1)) if match else None
+
+    for job in jobs[:warmup]:
+        call(job)
+
+    started = time.perf_counter()
+    results = list(pool.map(call, jobs[warmup:])) if pool else [call(j) for j in jobs[warmup:]]
+    wall = time.perf_counter() - started
+    return summarize(results, wall)
+
+
+def summarize(results, wall):
+    latencies = sorted(elapsed * 1000 for _, elapsed, _ in results)
+    queries = [q for _, _, q in results if q is not None]
+    statuses = defaultdict(int)
+    for status, _, _ in results:
+        statuses[status] += 1
+    return {
+        'requests': len(results),
+        'errors': sum(n for status, n in statuses.items() if status not in OK_STATUS),
+        'statuses': {str(k): v for k, v in sorted(statuses.items())},
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'throughput_rps': round(len(results) / wall, 1) if wall else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """List regressions of `results` against a saved baseline run.
+
+    Latency may grow by `tolerance` (0.2 = 20%) before it counts; query
+    counts are deterministic for a given seed, so any increase counts.
+    """
+    problems = []
+    for name, now in results['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if not before:
+            continue
+        for key in ('p50_ms', 'p95_ms'):
+            if now[key] > before[key] * (1 + tolerance):
+                problems.append(f'{name}: {key} {before[key]} -> {now[key]}')
+        if (now['queries_per_request'] is not None and before.get('queries_per_request') is not None
+                and now['queries_per_request'] > before['queries_per_request'] + 0.01):
+            problems.append(f"{name}: queries/request {before['queries_per_request']}"
+                            f" -> {now['queries_per_request']}")
+        if now['errors'] > before.get('errors', 0):
+            problems.append(f"{name}: errors {before.get('errors', 0)} -> {now['errors']}")
+    return problems
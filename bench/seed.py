@@ -0,0 +1,118 @@
+import random
+from datetime import datetime, timedelta
+
+from werkzeug.security import generate_password_hash
+
+from app import db
+from app.forms import CATEGORIES
+from app.models import User, Post, Like, Comment, followers
+from app.search import search_backend
+from app import categories, suggestions, timeline, trending
+
+PASSWORD = 'bench-password'
+WORDS = ('python flask database cache index query latency server thread worker '
+         'design music travel football science startup market teacher garden '
+         'painting camera coffee winter river planet code review deploy').split()
+
+
+def _sentence(rnd, n):
+    return ' '.join(rnd.choice(WORDS) for _ in range(n))
+
+
+def _chunked_insert(table, rows, size=5000):
+    for i in range(0, len(rows), size):
+        db.session.execute(table.insert(), rows[i:i + size])
+
+
+def seed(volumes, rnd_seed=42):
+    """Drop and recreate every table, then bulk-load a synthetic data set.
+
+    Counters are computed while generating, so the denormalized columns are
+    correct without a recount. Returns {table: rows written}.
+    """
+    rnd = random.Random(rnd_seed)
+    # like times come from their own stream so the rest of the data set
+    # stays what it was for a given seed
+    like_rnd = random.Random(rnd_seed + 1)
+    now = datetime.utcnow()
+
+    db.drop_all()
+    db.create_all()
+    search_backend().setup()
+
+    n_users = volumes['users']
+    password = generate_password_hash(PASSWORD)
+    user_ids = list(range(1, n_users + 1))
+
+    follows = set()
+    k = min(volumes['follows_per_user'], n_users - 1)
+    for uid in user_ids:
+        others = [o for o in rnd.sample(user_ids, k + 1) if o != uid]
+        follows.update((uid, other) for other in others[:k])
+    follower_count = {uid: 0 for uid in user_ids}
+    following_count = {uid: 0 for uid in user_ids}
+    for a, b in follows:
+        following_count[a] += 1
+        follower_count[b] += 1
+
+    _chunked_insert(User.__table__, [{
+        'id': uid, 'username': f'bench{uid}', 'email': f'bench{uid}@example.com',
+        'fullname': f'Bench User {uid}', 'password': password, 'bio': '',
+        'profile_pic': 'default.png', 'cover_photo': 'default_cover.jpg',
+        'follower_count': follower_count[uid], 'following_count': following_count[uid],
+        'updated_at': now,
+    } for uid in user_ids])
+    _chunked_insert(followers, [{'follower_id': a, 'followed_id': b} for a, b in follows])
+
+    posts, likes, comments = [], [], []
+    comment_id = 0
+    for pid in range(1, volumes['posts'] + 1):
+        posted = now - timedelta(minutes=rnd.randint(0, 60 * 24 * 90))
+        likers = rnd.sample(user_ids, min(rnd.randint(0, 2 * volumes['likes_per_post']), n_users))
+        likes += [{'user_id': uid, 'post_id': pid,
+                   'created_at': min(now, posted + timedelta(minutes=like_rnd.randint(0, 60 * 24 * 3)))}
+                  for uid in likers]
+
+        n_comments = rnd.randint(0, 2 * volumes['comments_per_post'])
+        thread = []  # (id, depth) of comments on this post
+        for _ in range(n_comments):
+            comment_id += 1
+            parent = None
+            if thread and rnd.random() < 0.5:
+                candidate = rnd.choice(thread)
+                if candidate[1] < volumes['reply_depth']:
+                    parent = candidate
+            comments.append({
+                'id': comment_id, 'content': _sentence(rnd, 12), 'user_id': rnd.choice(user_ids),
+                'post_id': pid, 'parent_id': parent[0] if parent else None,
+                'date_posted': posted + timedelta(minutes=rnd.randint(1, 600)),
+            })
+            thread.append((comment_id, parent[1] + 1 if parent else 0))
+
+        posts.append({
+            'id': pid, 'title': _sentence(rnd, 5).capitalize(), 'content': _sentence(rnd, 60),
+            'category': rnd.choice(CATEGORIES), 'user_id': rnd.choice(user_ids),
+            'date_posted': posted, 'updated_at': posted,
+            'like_count': len(likers), 'comment_count': n_comments,
+        })
+
+    _chunked_insert(Post.__table__, posts)
+    _chunked_insert(Like.__table__, likes)
+    _chunked_insert(Comment.__table__, comments)
+    if db.engine.dialect.name == 'postgresql':
+        # ids were given explicitly, so move the sequences past them
+        for table in ('user', 'post', 'comment', 'like'):
+            db.session.execute(db.text(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), "
+                f'coalesce((SELECT max(id) FROM "{table}"), 0) + 1, false)'
+            ))
+    db.session.commit()
+
+    search_backend().rebuild()
+    categories.rebuild()
+    entries = timeline.rebuild()
+    ranked = trending.refresh()
+    _, suggested = suggestions.refresh(full=True)
+    return {'users': n_users, 'follows': len(follows), 'posts': len(posts),
+            'likes': len(likes), 'comments': len(comments), 'timeline': entries,
+            'trending': ranked, 'suggestions': suggested}
@@ -0,0 +1,43 @@
+"""gunicorn settings, all overridable from the environment.
+
+GUNICORN_WORKER_CLASS picks the concurrency model:
+
+  sync     one request per process; a slow upload or client blocks the worker
+  gthread  (default) GUNICORN_THREADS requests per process
+  gevent   GUNICORN_WORKER_CONNECTIONS greenlets per process; needs `gevent`
+           (and `psycogreen` on Postgres) installed
+
+app/config.py reads the same variables to size the database pool, so both
+sides agree on how many connections a worker can ask for at once.
+"""
+import multiprocessing
+import os
+
+worker_class = os.environ.setdefault('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.setdefault(
+    'WEB_CONCURRENCY', str(min(multiprocessing.cpu_count() * 2 + 1, 8))
+))
+threads = int(os.environ.setdefault('GUNICORN_THREADS', '4'))
+worker_connections = int(os.environ.setdefault('GUNICORN_WORKER_CONNECTIONS', '100'))
+
+bind = '0.0.0.0:' + os.environ.get('PORT', '8000')
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then so slow leaks (image decoding, caches) cannot
+# grow without bound; the jitter keeps them from all restarting together.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None  # empty turns it off
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            return
+        # psycopg2 blocks the whole process on I/O unless told to yield
+        patch_psycopg()
@@ -0,0 +1,66 @@
+"""add like/follow unique indexes and foreign key indexes
+
+Revision ID: 5e8d04b6c1a7
+Revises: a3f1c92e7b40
+Create Date: 2026-10-17 11:03:27.551904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8d04b6c1a7'
+down_revision = 'a3f1c92e7b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    post = sa.table('post', sa.column('id'), sa.column('like_count'))
+    user = sa.table('user', sa.column('id'), sa.column('follower_count'), sa.column('following_count'))
+    like = sa.table('like', sa.column('id'), sa.column('user_id'), sa.column('post_id'))
+    followers = sa.table('followers', sa.column('follower_id'), sa.column('followed_id'))
+
+    # drop duplicate rows left behind by double-clicks before the unique indexes go on
+    keep = sa.select(sa.func.min(like.c.id)).group_by(like.c.user_id, like.c.post_id)
+    op.execute(like.delete().where(like.c.id.not_in(keep)))
+
+    op.execute('CREATE TABLE followers_dedup AS SELECT DISTINCT follower_id, followed_id FROM followers')
+    op.execute('DELETE FROM followers')
+    op.execute('INSERT INTO followers (follower_id, followed_id) SELECT follower_id, followed_id FROM followers_dedup')
+    op.execute('DROP TABLE followers_dedup')
+
+    # duplicates were counted too
+    op.execute(post.update().values(
+        like_count=sa.select(sa.func.count()).select_from(like)
+        .where(like.c.post_id == post.c.id).scalar_subquery(),
+    ))
+    op.execute(user.update().values(
+        follower_count=sa.select(sa.func.count()).select_from(followers)
+        .where(followers.c.followed_id == user.c.id).scalar_subquery(),
+        following_count=sa.select(sa.func.count()).select_from(followers)
+        .where(followers.c.follower_id == user.c.id).scalar_subquery(),
+    ))
+
+    op.create_index('ix_like_user_post', 'like', ['user_id', 'post_id'], unique=True)
+    op.create_index('ix_like_post_id', 'like', ['post_id'], unique=False)
+    op.create_index('ix_followers_pair', 'followers', ['follower_id', 'followed_id'], unique=True)
+    op.create_index('ix_followers_followed_id', 'followers', ['followed_id'], unique=False)
+    op.create_index(op.f('ix_post_user_id'), 'post', ['user_id'], unique=False)
+    op.create_index(op.f('ix_post_category'), 'post', ['category'], unique=False)
+    op.create_index(op.f('ix_post_date_posted'), 'post', ['date_posted'], unique=False)
+    op.create_index(op.f('ix_comment_post_id'), 'comment', ['post_id'], unique=False)
+    op.create_index(op.f('ix_comment_parent_id'), 'comment', ['parent_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_comment_parent_id'), table_name='comment')
+    op.drop_index(op.f('ix_comment_post_id'), table_name='comment')
+    op.drop_index(op.f('ix_post_date_posted'), table_name='post')
+    op.drop_index(op.f('ix_post_category'), table_name='post')
+    op.drop_index(op.f('ix_post_user_id'), table_name='post')
+    op.drop_index('ix_followers_followed_id', table_name='followers')
+    op.drop_index('ix_followers_pair', table_name='followers')
+    op.drop_index('ix_like_post_id', table_name='like')
+    op.drop_index('ix_like_user_post', table_name='like')
@@ -0,0 +1,56 @@
+"""add denormalized like/comment/follower counters
+
+Revision ID: a3f1c92e7b40
+Revises: 34175636af81
+Create Date: 2026-10-17 10:12:41.208311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c92e7b40'
+down_revision = '34175636af81'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('follower_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('following_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill from the existing rows
+    post = sa.table('post', sa.column('id'), sa.column('like_count'), sa.column('comment_count'))
+    user = sa.table('user', sa.column('id'), sa.column('follower_count'), sa.column('following_count'))
+    like = sa.table('like', sa.column('post_id'))
+    comment = sa.table('comment', sa.column('post_id'))
+    followers = sa.table('followers', sa.column('follower_id'), sa.column('followed_id'))
+
+    op.execute(post.update().values(
+        like_count=sa.select(sa.func.count()).select_from(like)
+        .where(like.c.post_id == post.c.id).scalar_subquery(),
+        comment_count=sa.select(sa.func.count()).select_from(comment)
+        .where(comment.c.post_id == post.c.id).scalar_subquery(),
+    ))
+    op.execute(user.update().values(
+        follower_count=sa.select(sa.func.count()).select_from(followers)
+        .where(followers.c.followed_id == user.c.id).scalar_subquery(),
+        following_count=sa.select(sa.func.count()).select_from(followers)
+        .where(followers.c.follower_id == user.c.id).scalar_subquery(),
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('following_count')
+        batch_op.drop_column('follower_count')
+
+    with op.batch_alter_table('post', schema=None) as batch_op:
+        batch_op.drop_column('comment_count')
+        batch_op.drop_column('like_count')
@@ -0,0 +1,78 @@
+"""add the full-text search index (SQLite FTS5 tables / Postgres tsvector)
+
+Revision ID: a7d3e5f19c62
+Revises: 5c3e8a1d7f20
+Create Date: 2026-10-17 21:12:40.286514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d3e5f19c62'
+down_revision = '5c3e8a1d7f20'
+branch_labels = None
+depends_on = None
+
+# app.search.USER_TSVECTOR; the search query has to use the indexed expression
+USER_TSVECTOR = "to_tsvector('simple', coalesce(username, '') || ' ' || coalesce(fullname, ''))"
+
+
+def upgrade():
+    # IF NOT EXISTS throughout: older app versions created these at startup
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _upgrade_sqlite()
+    elif dialect == 'postgresql':
+        _upgrade_postgresql()
+
+
+def _upgrade_sqlite():
+    has_fts5 = op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pragma_compile_options WHERE compile_options = 'ENABLE_FTS5'"
+    )).first()
+    if not has_fts5:  # app.search falls back to substring matching
+        return
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5("
+        "title, content, author, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS user_fts USING fts5("
+        "username, fullname, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    # index what is already there; the app keeps it current from now on
+    op.execute("DELETE FROM post_fts")
+    op.execute("DELETE FROM user_fts")
+    op.execute(
+        "INSERT INTO post_fts (rowid, title, content, author) "
+        "SELECT p.id, p.title, p.content, u.username || ' ' || coalesce(u.fullname, '') "
+        "FROM post p JOIN \"user\" u ON u.id = p.user_id"
+    )
+    op.execute(
+        "INSERT INTO user_fts (rowid, username, fullname) "
+        "SELECT id, username, coalesce(fullname, '') FROM \"user\""
+    )
+
+
+def _upgrade_postgresql():
+    op.execute(
+        "ALTER TABLE post ADD COLUMN IF NOT EXISTS search_vector tsvector "
+        "GENERATED ALWAYS AS ("
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS ix_post_search_vector ON post USING GIN (search_vector)")
+    op.execute(f'CREATE INDEX IF NOT EXISTS ix_user_search ON "user" USING GIN ({USER_TSVECTOR})')
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("DROP TABLE IF EXISTS user_fts")
+        op.execute("DROP TABLE IF EXISTS post_fts")
+    elif dialect == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_user_search")
+        op.execute("DROP INDEX IF EXISTS ix_post_search_vector")
+        op.execute("ALTER TABLE post DROP COLUMN IF EXISTS search_vector")
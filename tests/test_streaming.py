@@ -0,0 +1,130 @@
+"""Byte-range and conditional requests against /main/video (app.streaming)."""
+import os
+
+import pytest
+
+from app import create_app
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+SIZE = len(DATA)
+URL = '/main/video/clip.mp4'
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "test.db"}')
+    monkeypatch.setenv('UPLOAD_TMP_FOLDER', str(tmp_path / 'tmp'))
+    app = create_app()
+    app.config['TESTING'] = True
+    uploads = tmp_path / 'uploads'
+    app.config['UPLOAD_FOLDER'] = str(uploads)
+    app.extensions['storage'].root = str(uploads)
+    os.makedirs(uploads / 'post_videos')
+    (uploads / 'post_videos' / 'clip.mp4').write_bytes(DATA)
+    return app.test_client()
+
+
+def _multipart_parts(response):
+    boundary = response.headers['Content-Type'].split('boundary=')[1].encode()
+    parts = []
+    for chunk in response.data.split(b'--' + boundary)[1:]:
+        if chunk.startswith(b'--'):
+            break
+        head, body = chunk.split(b'\r\n\r\n', 1)
+        content_range = [line for line in head.split(b'\r\n') if line.startswith(b'Content-Range')]
+        parts.append((content_range[0].decode(), body[:-2]))  # body ends with the CRLF before the next boundary
+    return parts
+
+
+def test_whole_file(client):
+    r = client.get(URL)
+    assert r.status_code == 200
+    assert r.data == DATA
+    assert r.headers['Accept-Ranges'] == 'bytes'
+    assert r.headers['Content-Length'] == str(SIZE)
+    assert r.headers['Content-Type'] == 'video/mp4'
+
+
+def test_single_range(client):
+    r = client.get(URL, headers={'Range': 'bytes=100-199'})
+    assert r.status_code == 206
+    assert r.data == DATA[100:200]
+    assert r.headers['Content-Range'] == f'bytes 100-199/{SIZE}'
+    assert r.headers['Content-Length'] == '100'
+
+
+def test_range_past_the_end_is_clamped(client):
+    r = client.get(URL, headers={'Range': 'bytes=10000-99999'})
+    assert r.status_code == 206
+    assert r.data == DATA[10000:]
+    assert r.headers['Content-Range'] == f'bytes 10000-{SIZE - 1}/{SIZE}'
+
+
+def test_open_ended_range(client):
+    r = client.get(URL, headers={'Range': 'bytes=500-'})
+    assert r.status_code == 206
+    assert r.data == DATA[500:]
+    assert r.headers['Content-Range'] == f'bytes 500-{SIZE - 1}/{SIZE}'
+    assert r.headers['Content-Length'] == str(SIZE - 500)
+
+
+def test_suffix_range(client):
+    r = client.get(URL, headers={'Range': 'bytes=-500'})
+    assert r.status_code == 206
+    assert r.data == DATA[-500:]
+    assert r.headers['Content-Range'] == f'bytes {SIZE - 500}-{SIZE - 1}/{SIZE}'
+
+
+def test_multiple_ranges(client):
+    r = client.get(URL, headers={'Range': 'bytes=0-9,20-29,-40'})
+    assert r.status_code == 206
+    assert r.headers['Content-Type'].startswith('multipart/byteranges; boundary=')
+    assert int(r.headers['Content-Length']) == len(r.data)
+    assert _multipart_parts(r) == [
+        (f'Content-Range: bytes 0-9/{SIZE}', DATA[0:10]),
+        (f'Content-Range: bytes 20-29/{SIZE}', DATA[20:30]),
+        (f'Content-Range: bytes {SIZE - 40}-{SIZE - 1}/{SIZE}', DATA[-40:]),
+    ]
+
+
+def test_multiple_ranges_with_open_end(client):
+    r = client.get(URL, headers={'Range': 'bytes=0-0,10200-'})
+    assert r.status_code == 206
+    assert _multipart_parts(r) == [
+        (f'Content-Range: bytes 0-0/{SIZE}', DATA[:1]),
+        (f'Content-Range: bytes 10200-{SIZE - 1}/{SIZE}', DATA[10200:]),
+    ]
+
+
+def test_unsatisfiable_range(client):
+    r = client.get(URL, headers={'Range': f'bytes={SIZE}-'})
+    assert r.status_code == 416
+    assert r.headers['Content-Range'] == f'bytes */{SIZE}'
+    assert r.data == b''
+
+
+def test_if_range_mismatch_sends_whole_file(client):
+    r = client.get(URL, headers={'Range': 'bytes=0-9', 'If-Range': '"stale-etag"'})
+    assert r.status_code == 200
+    assert r.data == DATA
+
+
+def test_if_range_match_sends_range(client):
+    etag = client.get(URL).headers['ETag']
+    r = client.get(URL, headers={'Range': 'bytes=0-9', 'If-Range': etag})
+    assert r.status_code == 206
+    assert r.data == DATA[:10]
+
+
+def test_not_modified(client):
+    first = client.get(URL)
+    r = client.get(URL, headers={'If-None-Match': first.headers['ETag']})
+    assert r.status_code == 304
+    assert r.data == b''
+    r = client.get(URL, headers={'If-Modified-Since': first.headers['Last-Modified']})
+    assert r.status_code == 304
+
+
+def test_missing_and_outside_files(client):
+    assert client.get('/main/video/nope.mp4').status_code == 404
+    assert client.get('/main/video/..%2F..%2Ftest.db').status_code == 404